@@ -0,0 +1,134 @@
+# albums.py
+# Сборка медиагруппы (/ad) из отдельных апдейтов.
+#
+# Telegram присылает альбом по одному сообщению на фото/видео, признак
+# конца альбома не передаётся. Альбом считается собранным, когда новых
+# элементов нет дольше адаптивной паузы (по наблюдаемым интервалам между
+# элементами) или набралось MAX_ITEMS. На альбом — один таймер, хранятся
+# только (вид, file_id).
+
+import asyncio
+import collections
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_ITEMS = 10          # лимит sendMediaGroup
+MIN_WAIT  = 0.3         # пауза, после которой альбом считается полным
+MAX_WAIT  = 3.0
+GAP_FACTOR = 3.0        # пауза = GAP_FACTOR × наибольший интервал между элементами
+MAX_DONE  = 1000        # сколько собранных media_group_id помнить (опоздавшие элементы)
+
+
+class Album:
+    __slots__ = ("key", "items", "caption", "started", "last", "max_gap", "deadline", "payload", "task")
+
+    def __init__(self, key: Hashable, payload: Any):
+        self.key = key
+        self.items: List[Tuple[int, str, str]] = []     # (message_id, "photo"/"video", file_id)
+        self.caption: Optional[str] = None
+        self.started = self.last = time.monotonic()
+        self.max_gap = 0.0
+        self.deadline = 0.0
+        self.payload = payload                          # для on_complete (update, context)
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def media(self) -> List[Tuple[str, str]]:
+        """[(вид, file_id)] в порядке сообщений."""
+        return [(kind, fid) for _, kind, fid in sorted(self.items)]
+
+
+class AlbumAggregator:
+    def __init__(self, on_complete: Callable[[Album], Awaitable[Any]], *,
+                 min_wait: float = MIN_WAIT, max_wait: float = MAX_WAIT, max_items: int = MAX_ITEMS):
+        self._on_complete = on_complete
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.max_items = max_items
+        self._pending: Dict[Hashable, Album] = {}
+        self._done: "collections.OrderedDict[Hashable, None]" = collections.OrderedDict()
+        self._gap_avg = 0.0         # EWMA интервалов по всем альбомам — старт для новых
+        self._stats = {"albums": 0, "items": 0, "late": 0, "overflow": 0,
+                       "latency_sum": 0.0, "latency_max": 0.0}
+
+    def _wait(self, album: Album) -> float:
+        gap = album.max_gap if len(album.items) > 1 else self._gap_avg
+        return min(self.max_wait, max(self.min_wait, GAP_FACTOR * gap))
+
+    def add(self, key: Hashable, kind: str, file_id: str, message_id: int, *,
+            caption: Optional[str] = None, payload: Any = None) -> str:
+        """
+        Добавляет элемент альбома. Возвращает "added", "late" (альбом уже
+        собран и отдан) или "overflow" (больше max_items — элемент отброшен).
+        """
+        if key in self._done:
+            self._stats["late"] += 1
+            return "late"
+        album = self._pending.get(key)
+        now = time.monotonic()
+        if album is None:
+            album = self._pending[key] = Album(key, payload)
+        else:
+            gap = now - album.last
+            album.max_gap = max(album.max_gap, gap)
+            self._gap_avg = gap if not self._gap_avg else 0.8 * self._gap_avg + 0.2 * gap
+            album.last = now
+            album.payload = payload or album.payload
+        if len(album.items) >= self.max_items:
+            self._stats["overflow"] += 1
+            return "overflow"
+        album.items.append((message_id, kind, file_id))
+        if caption:
+            album.caption = caption
+        self._stats["items"] += 1
+
+        if len(album.items) >= self.max_items:
+            album.deadline = now
+        else:
+            album.deadline = now + self._wait(album)
+        if album.task is None:
+            album.task = asyncio.create_task(self._timer(album))
+        elif album.deadline <= now:
+            album.task.cancel()
+            album.task = asyncio.create_task(self._timer(album))
+        return "added"
+
+    def discard(self, key: Optional[Hashable]) -> None:
+        """Отмена сборки (/cancel, повторный /ad, ошибка)."""
+        album = self._pending.pop(key, None)
+        if album and album.task:
+            album.task.cancel()
+
+    async def _timer(self, album: Album) -> None:
+        try:
+            while (delay := album.deadline - time.monotonic()) > 0:
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            return
+        if self._pending.get(album.key) is not album:
+            return
+        del self._pending[album.key]
+        self._done[album.key] = None
+        while len(self._done) > MAX_DONE:
+            self._done.popitem(last=False)
+
+        latency = time.monotonic() - album.started
+        self._stats["albums"] += 1
+        self._stats["latency_sum"] += latency
+        self._stats["latency_max"] = max(self._stats["latency_max"], latency)
+        try:
+            await self._on_complete(album)
+        except Exception:
+            logger.exception("albums: on_complete failed for %s", album.key)
+
+    def stats(self) -> Dict[str, Any]:
+        st = dict(self._stats)
+        n = st.pop("latency_sum")
+        st["latency_avg"] = round(n / st["albums"], 3) if st["albums"] else 0.0
+        st["latency_max"] = round(st["latency_max"], 3)
+        st["pending"] = len(self._pending)
+        st["gap_avg"] = round(self._gap_avg, 3)
+        return st
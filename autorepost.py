@@ -0,0 +1,114 @@
+# autorepost.py
+# Авторепост: прогон по всем активным объектам, у которых подошёл срок.
+#
+# Объекты забираются из БД пачками (claim — параллельные воркеры не
+# пересекаются), внутри пачки репостятся с ограниченной параллельностью,
+# после каждой пачки курсор и счётчики сохраняются в repost_sweeps.
+# Пачка уходит в канал долго (альбом — ~11 сообщений при лимите ~20 в
+# минуту), поэтому перед репостом каждого объекта аренда ещё не начатых
+# объектов пачки продлевается; объект, аренду которого забрал другой
+# воркер, пропускается. Если процесс упал посреди прогона, следующий запуск
+# продолжит его с последней сохранённой пачки; уже репостнутые объекты
+# в выборку не попадут (у них свежий repost_date).
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict
+
+from db_async import (
+    list_active_objects_for_repost,
+    renew_repost_claims,
+    release_repost_claims,
+    start_repost_sweep,
+    checkpoint_repost_sweep,
+    finish_repost_sweep,
+)
+
+logger = logging.getLogger(__name__)
+
+# repost(code) → True (репостнут) / False (пропущен: рано, нет медиа, …)
+RepostFn = Callable[[str], Awaitable[bool]]
+
+
+async def run_sweep(
+    repost: RepostFn,
+    *,
+    cutoff_days: float = 3,
+    batch_size: int = 50,
+    concurrency: int = 4,
+    lease_seconds: int = 900,
+) -> Dict[str, Any]:
+    """
+    Репостит всё, что не репостилось дольше cutoff_days (или продолжает
+    незавершённый прогон). Возвращает сводку по прогону (с учётом других
+    воркеров и прошлых запусков): reposted / skipped / failed, seconds и
+    objects_per_min. lease_seconds должен покрывать репост concurrency
+    объектов подряд — аренда продлевается перед каждым объектом.
+    """
+    owner = uuid.uuid4().hex
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=cutoff_days)).isoformat()
+    sweep = await start_repost_sweep(cutoff)
+    sweep_id = sweep["id"]
+    cutoff = sweep["cutoff"].isoformat()        # при продолжении — cutoff того прогона
+    after = None
+    if sweep["after_code"] is not None:
+        after = (sweep["after_date"].isoformat() if sweep["after_date"] else None, sweep["after_code"])
+    totals = sweep
+    resumed = after is not None
+    if resumed:
+        logger.info("auto_repost: resuming sweep %s after %s", sweep_id, after[1])
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(code: str, waiting: set) -> str:
+        async with sem:
+            waiting.discard(code)
+            try:
+                held = await renew_repost_claims([code, *waiting], owner, lease_seconds)
+                if code not in held:
+                    logger.warning("auto_repost %s: claim lost, skipped", code)
+                    return "lost"
+                return "reposted" if await repost(code) else "skipped"
+            except Exception as e:
+                logger.warning("auto_repost %s failed: %s", code, e)
+                return "failed"
+
+    while True:
+        batch_started = time.monotonic()
+        batch = await list_active_objects_for_repost(
+            cutoff, limit=batch_size, after=after, claim=True,
+            lease_seconds=lease_seconds, owner=owner,
+        )
+        if not batch:
+            break
+        waiting = {str(code) for _, code, _ in batch}
+        results = await asyncio.gather(*(one(str(code), waiting) for _, code, _ in batch))
+        counts = {"reposted": 0, "skipped": 0, "failed": 0}
+        for res in results:
+            counts["skipped" if res == "lost" else res] += 1
+        # не репостнутые объекты остаются позади курсора — аренда им больше не нужна
+        # (чужую, перехваченную после истечения, не трогаем)
+        await release_repost_claims(
+            [code for (_, code, _), res in zip(batch, results) if res != "reposted"], owner
+        )
+        _, last_code, last_date = batch[-1]
+        after = (last_date, last_code)
+        totals = await checkpoint_repost_sweep(
+            sweep_id, after, counts["reposted"], counts["skipped"], counts["failed"],
+            time.monotonic() - batch_started,
+        ) or totals
+
+    await finish_repost_sweep(sweep_id)
+    counts = {k: totals[k] for k in ("reposted", "skipped", "failed")}
+    seconds = float(totals["seconds"])
+    total = sum(counts.values())
+    return {
+        "sweep_id": sweep_id,
+        "resumed": resumed,
+        **counts,
+        "seconds": round(seconds, 1),
+        "objects_per_min": round(total * 60 / seconds, 1) if seconds > 0 else 0.0,
+    }
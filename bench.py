@@ -0,0 +1,225 @@
+# bench.py
+# Микробенчмарки горячих путей рендера и маппинга (без БД и сети).
+#
+#   python bench.py                 — прогон и сравнение с bench_baseline.json
+#   python bench.py --save          — записать текущие цифры как baseline
+#   python bench.py -k caption      — только кейсы, в имени которых есть «caption»
+#
+# По каждому кейсу: ops/sec (лучший из нескольких повторов) и память на
+# вызов (пик tracemalloc, байт). Кейс, который стал медленнее baseline
+# больше чем на --threshold, считается регрессией — код выхода 1.
+# Отчёт дублируется в bench_output.txt. Baseline зависит от машины:
+# сохраняйте его там же, где потом сравниваете.
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import db
+import channeltest as ct
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+OUTPUT_PATH   = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_output.txt")
+THRESHOLD     = 0.25        # допустимое падение ops/sec относительно baseline
+MIN_TIME      = 0.2         # сек на один повтор
+REPEATS       = 5
+BOT           = "bench_bot"
+
+
+# ─── синтетические данные: по объекту каждого вида ─────────────────
+_COMMON = {
+    "object_code": "10234", "realtor_code": "5551234", "district": "Мирабадский",
+    "Ориентир": "Метро Ойбек", "Цена": "125 000 у.е.", "Дополнительно": "Торг уместен",
+}
+ANKETS: Dict[str, Dict[str, Any]] = {
+    "old_fund": {
+        **_COMMON, "ptype": "Старыйфонд", "Тип заявки": "Продажа",
+        "Комнаты": "3", "Площадь": "75 м²", "Этаж": "2", "Этажность": "4",
+        "Санузлы": "раздельный санузел", "Состояние": "Новый ремонт", "Материал строения": "Кирпич",
+    },
+    "new_fund": {
+        **_COMMON, "ptype": "Новыйфонд", "Тип заявки": "Аренда",
+        "ЖК": "Tashkent City", "Год постройки": "2021", "Комнаты": "2", "Площадь": "64,5 м²",
+        "Этаж": "12", "Этажность": "16", "Санузлы": "1", "Состояние": "Чистовая отделка",
+        "Материал строения": "Монолит",
+    },
+    "land": {
+        **_COMMON, "ptype": "Участок", "Тип заявки": "Продажа",
+        "Тип недвижимости": "Дом", "Площадь участка": "6 сот", "Площадь дома": "180 м²",
+        "Размер участка": "20 × 30", "Этажность": "2", "Состояние": "Косметический ремонт",
+        "Материал строения": "Газоблок", "Заезд авто": "Есть",
+    },
+    "commerce": {
+        **_COMMON, "ptype": "Коммерция", "Тип заявки": "Аренда",
+        "Целевое назначение": ["Офис", "Склад"], "Расположение": "1 - линия", "Этаж": "1",
+        "Этажность": "3", "Площадь помещения": "240 м²", "Площадь участка": "4 сот",
+        "Учёт НДС": "с учетом НДС", "Собственник": "юр. лицо",
+    },
+}
+
+def _db_row(kind: str) -> Tuple[Any, ...]:
+    """Строка listings (SELECT _LISTING_SELECT) для анкеты ANKETS[kind]."""
+    data = ANKETS[kind]
+    fields = {**db._COMMON_FIELDS, **db._KIND_FIELDS[kind]}
+    values: Dict[str, Any] = {col: data.get(key) for col, key in fields.items()}
+    if isinstance(values.get("nazna4enie"), list):
+        values["nazna4enie"] = ", ".join(values["nazna4enie"])
+    values.update(
+        kind=kind, object_code=data["object_code"], realtor_code=data["realtor_code"],
+        district=data["district"], order_type=data["Тип заявки"], status="active",
+        photos=[f"photo_{kind}_{i}" for i in range(6)], videos=[f"video_{kind}"],
+        message_ids=list(range(100, 107)), old_price="140 000 у.е.",
+    )
+    return tuple(values.get(col) for col in db._LISTING_SELECT)
+
+ROWS = {kind: _db_row(kind) for kind in db.LISTING_KINDS}
+LISTINGS = {
+    kind: db.LISTING_MODELS[kind].from_row(row, db._LISTING_PAIRS[kind])
+    for kind, row in ROWS.items()
+}
+CAPTION_DATA = {kind: ct._caption_data(rec) for kind, rec in LISTINGS.items()}
+
+
+# ─── кейсы ─────────────────────────────────────────────────────────
+def _cold_caption(rec: dict) -> str:
+    ct._caption_cache.clear()
+    return ct.build_caption(rec, BOT)
+
+def _cold_keyboard(data: dict):
+    ct._KB_CACHE.clear()
+    return ct.build_keyboard(data)
+
+def _cases() -> Dict[str, Callable[[], Any]]:
+    cases: Dict[str, Callable[[], Any]] = {}
+    for kind in db.LISTING_KINDS:
+        anketa, row, rec = ANKETS[kind], ROWS[kind], LISTINGS[kind]
+        data = CAPTION_DATA[kind]
+        pairs = db._LISTING_PAIRS[kind]
+        model = db.LISTING_MODELS[kind]
+        cases[f"build_caption[{kind}]"]       = lambda a=anketa: ct.build_caption(a, BOT)
+        cases[f"build_caption_cold[{kind}]"]  = lambda a=anketa: _cold_caption(a)
+        cases[f"build_caption_db[{kind}]"]    = lambda d=data: _cold_caption(d)
+        cases[f"build_myads_caption[{kind}]"] = lambda d=data: ct.build_myads_caption(d, BOT)
+        cases[f"build_keyboard[{kind}]"]      = lambda a=anketa: ct.build_keyboard(a)
+        cases[f"build_keyboard_cold[{kind}]"] = lambda a=anketa: _cold_keyboard(a)
+        cases[f"pack_media[{kind}]"]          = lambda r=rec: ct._pack_media(r["photos"], r["videos"], "caption")
+        # на месте прежних _kind_row/_add_public_fields/_map_common_media
+        cases[f"listing_from_row[{kind}]"]    = lambda r=row, m=model, p=pairs: m.from_row(r, p)
+        cases[f"listing_public[{kind}]"]      = lambda r=rec: r.public()
+    cases["price_to_int"] = lambda: ct._price_to_int("1 250 000 у.е.")
+    cases["format_price"] = lambda: ct._format_price("1250000")
+    return cases
+
+
+# ─── измерение ─────────────────────────────────────────────────────
+def _ops_per_sec(fn: Callable[[], Any]) -> float:
+    n = 1
+    while True:                               # подбираем число вызовов на повтор
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        spent = time.perf_counter() - t0
+        if spent >= MIN_TIME / 4:
+            break
+        n *= 4
+    n = max(1, int(n * MIN_TIME / spent))
+    best = float("inf")
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        best = min(best, time.perf_counter() - t0)
+    return n / best
+
+def _bytes_per_call(fn: Callable[[], Any], calls: int = 200) -> float:
+    fn()                                      # прогрев кешей и ленивых структур
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        keep = [fn() for _ in range(calls)]   # результаты держим — считаем и их размер
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del keep
+    return (peak - base) / calls
+
+def run(pattern: str = "") -> Dict[str, Dict[str, float]]:
+    res: Dict[str, Dict[str, float]] = {}
+    for name, fn in _cases().items():
+        if pattern and pattern not in name:
+            continue
+        res[name] = {
+            "ops_per_sec": round(_ops_per_sec(fn), 1),
+            "bytes_per_call": round(_bytes_per_call(fn), 1),
+        }
+    return res
+
+def compare(res: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> Tuple[List[str], List[str]]:
+    lines, regressions = [], []
+    lines.append(f"{'case':<34} {'ops/sec':>12} {'base':>12} {'Δ':>7} {'B/call':>9}")
+    for name, cur in res.items():
+        base = baseline.get(name)
+        ops = cur["ops_per_sec"]
+        if base:
+            delta = ops / base["ops_per_sec"] - 1
+            mark = ""
+            if delta < -threshold:
+                mark = "  ← REGRESSION"
+                regressions.append(name)
+            lines.append(f"{name:<34} {ops:>12,.0f} {base['ops_per_sec']:>12,.0f} "
+                         f"{delta:>+7.0%} {cur['bytes_per_call']:>9,.0f}{mark}")
+        else:
+            lines.append(f"{name:<34} {ops:>12,.0f} {'—':>12} {'':>7} {cur['bytes_per_call']:>9,.0f}")
+    return lines, regressions
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Микробенчмарки рендера и маппинга")
+    p.add_argument("-k", dest="pattern", default="", help="только кейсы, содержащие подстроку")
+    p.add_argument("--save", action="store_true", help="сохранить результаты как baseline")
+    p.add_argument("--threshold", type=float, default=THRESHOLD,
+                   help="допустимое падение ops/sec (доля, по умолчанию %(default)s)")
+    p.add_argument("--baseline", default=BASELINE_PATH)
+    args = p.parse_args()
+
+    res = run(args.pattern)
+    if args.save:
+        # baseline — по худшему из двух прогонов, чтобы удачный пик не стал нормой
+        for name, cur in run(args.pattern).items():
+            res[name]["ops_per_sec"] = min(res[name]["ops_per_sec"], cur["ops_per_sec"])
+    baseline: Dict[str, Dict[str, float]] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    lines, regressions = compare(res, baseline, args.threshold)
+    if regressions and not args.save:
+        # шум планировщика даёт разовые провалы — подозрительные кейсы перемеряем
+        cases = _cases()
+        for name in regressions:
+            res[name]["ops_per_sec"] = max(res[name]["ops_per_sec"], round(_ops_per_sec(cases[name]), 1))
+        lines, regressions = compare(res, baseline, args.threshold)
+    if regressions:
+        lines += ["", f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}"]
+    report = "\n".join(lines)
+    print(report)
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+        f.write(report + "\n")
+
+    if args.save:
+        baseline.update(res)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(baseline.items())), f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"baseline saved: {args.baseline}")
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
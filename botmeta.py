@@ -0,0 +1,65 @@
+# botmeta.py
+# Кеш «кто мы»: username бота и username канала.
+#
+# Загружается один раз в post_init, обновляется по TTL (или даром — из
+# апдейтов канала), поэтому ссылки на посты строятся без get_me/get_chat
+# на каждый запрос.
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from telegram import Bot, Chat
+
+logger = logging.getLogger(__name__)
+
+
+class BotMeta:
+    def __init__(self, channel_id: int, ttl: float = 6 * 3600):
+        self.channel_id = channel_id
+        self.ttl = ttl
+        self.bot_username: Optional[str] = None
+        self.channel_username: Optional[str] = None
+        self._link_prefix = self._make_prefix(None)
+        self._expires = 0.0
+        self._lock = asyncio.Lock()
+
+    def _make_prefix(self, username: Optional[str]) -> str:
+        if username:
+            return f"https://t.me/{username}/"
+        # приватный канал: -100XXXXXXXXXX → t.me/c/XXXXXXXXXX
+        return f"https://t.me/c/{str(self.channel_id)[4:]}/"
+
+    def _set_channel(self, username: Optional[str]) -> None:
+        self.channel_username = username
+        self._link_prefix = self._make_prefix(username)
+
+    async def load(self, bot: Bot) -> None:
+        """getMe + getChat(канал); при ошибке остаёмся на старых значениях."""
+        async with self._lock:
+            me = await bot.get_me()
+            chat = await bot.get_chat(self.channel_id)
+            self.bot_username = me.username
+            self._set_channel(chat.username)
+            self._expires = time.monotonic() + self.ttl
+
+    async def ensure(self, bot: Bot) -> None:
+        """Перечитывает данные, если TTL истёк (или они ещё не загружались)."""
+        if time.monotonic() < self._expires:
+            return
+        try:
+            await self.load(bot)
+        except Exception as e:
+            if self.bot_username is None:
+                raise
+            logger.warning("botmeta: refresh failed, keeping cached values: %s", e)
+            self._expires = time.monotonic() + min(self.ttl, 60)
+
+    def on_channel_update(self, chat: Chat) -> None:
+        """Апдейт из канала уже несёт актуальный username — обновим кеш бесплатно."""
+        if chat.id == self.channel_id and chat.username != self.channel_username:
+            self._set_channel(chat.username)
+
+    def post_link(self, message_id: int) -> str:
+        return self._link_prefix + str(message_id)
@@ -1,12 +1,16 @@
 # db_pg.py
 # Полная версия под Postgres (psycopg2), без os.getenv.
 
-import json
+import collections
 import re
+import time
 import datetime
-from typing import List, Dict, Any, Optional, Tuple, Union
+import threading
+from contextlib import contextmanager
+from typing import Deque, List, Dict, Any, Optional, Tuple, Union
 
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
 
 
@@ -18,36 +22,331 @@ def set_dsn(dsn: str) -> None:
     """Задайте DSN перед любыми вызовами БД."""
     global _DATABASE_URL
     _DATABASE_URL = dsn
+    close_pool()
+    _code_allocator.reset()
 
-def _connect():
+def _connect(statement_timeout_ms: Optional[int] = None):
+    """Открывает новое «сырое» соединение (используется только пулом)."""
     if not _DATABASE_URL:
         raise RuntimeError("DATABASE_URL is not set. Call set_dsn(dsn) first.")
-    conn = psycopg2.connect(_DATABASE_URL, connect_timeout=10)
+    kwargs: Dict[str, Any] = {"connect_timeout": 10}
+    if statement_timeout_ms:
+        kwargs["options"] = f"-c statement_timeout={int(statement_timeout_ms)}"
+    conn = psycopg2.connect(_DATABASE_URL, **kwargs)
     conn.autocommit = True
     return conn
 
+
+# ────────────────────── пул соединений ──────────────────────
+
+class PoolTimeout(RuntimeError):
+    """Не удалось получить соединение из пула за acquire_timeout секунд."""
+
+
+class _Pool:
+    """
+    Потокобезопасный пул psycopg2-соединений.
+
+    • держит от min_size до max_size соединений, свободные отдаёт по LIFO;
+    • соединения, простаивающие дольше max_idle (сверх min_size) или
+      прожившие дольше max_lifetime, закрываются;
+    • если соединение простаивало дольше health_check_after — перед выдачей
+      проверяется «SELECT 1», битое заменяется новым;
+    • statement_timeout задаётся при открытии соединения и может быть
+      переопределён на время одной выдачи.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_size: int,
+        max_size: int,
+        max_idle: float,
+        max_lifetime: float,
+        health_check_after: float,
+        statement_timeout_ms: Optional[int],
+        acquire_timeout: float,
+    ):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("invalid pool size: min_size=%r max_size=%r" % (min_size, max_size))
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self.statement_timeout_ms = statement_timeout_ms
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        self._idle: List[Tuple[Any, float, float]] = []   # (conn, created_at, last_used)
+        self._born: Dict[int, float] = {}                 # id(conn) → created_at (выданные)
+        self._size = 0                                    # открытые, включая выданные
+        self._closed = False
+        self._stats: Dict[str, float] = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "timeouts": 0,
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "health_checks": 0,
+            "health_check_failures": 0,
+        }
+
+    # ── открытие / закрытие ──
+    def _open(self):
+        conn = _connect(self.statement_timeout_ms)
+        with self._cond:
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def _discard(self, conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats["connections_closed"] += 1
+            self._cond.notify()
+
+    def _reap_locked(self, now: float) -> list:
+        """Вынимает из свободных просроченные соединения (закрывать — вне лока)."""
+        doomed, keep = [], []
+        for item in self._idle:
+            conn, born, used = item
+            too_old  = self.max_lifetime and now - born > self.max_lifetime
+            too_idle = self.max_idle and now - used > self.max_idle
+            if conn.closed or too_old or (too_idle and self._size - len(doomed) > self.min_size):
+                doomed.append(conn)
+            else:
+                keep.append(item)
+        self._idle = keep
+        return doomed
+
+    def _healthy(self, conn) -> bool:
+        with self._cond:
+            self._stats["health_checks"] += 1
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1;")
+            cur.fetchone()
+            cur.close()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    # ── выдача / возврат ──
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.acquire_timeout
+        waited = False
+        item = None
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("connection pool is closed")
+            self._stats["checkouts"] += 1
+            while True:
+                doomed = self._reap_locked(time.monotonic())
+                if doomed:
+                    self._size -= len(doomed)
+                    self._stats["connections_closed"] += len(doomed)
+                    for c in doomed:
+                        try:
+                            c.close()
+                        except Exception:
+                            pass
+                if self._idle:
+                    item = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1          # резервируем слот, откроем вне лока
+                    break
+                waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"no free connection in {self.acquire_timeout}s (max_size={self.max_size})"
+                    )
+                self._cond.wait(remaining)
+            if waited:
+                spent = time.monotonic() - started
+                self._stats["waits"] += 1
+                self._stats["wait_seconds_total"] += spent
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], spent)
+
+        if item is not None:
+            conn, born, used = item
+            if (time.monotonic() - used) <= self.health_check_after or self._healthy(conn):
+                self._born[id(conn)] = born
+                return conn
+            # битое соединение: закрываем и открываем новое в том же слоте
+            try:
+                conn.close()
+            except Exception:
+                pass
+            with self._cond:
+                self._stats["connections_closed"] += 1
+
+        try:
+            conn = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self._born[id(conn)] = time.monotonic()
+        return conn
+
+    def putconn(self, conn, *, broken: bool = False) -> None:
+        born = self._born.pop(id(conn), time.monotonic())
+        if not broken and not conn.closed:
+            # соединение должно вернуться без открытой транзакции
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+        if broken or conn.closed or self._closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, born, time.monotonic()))
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._stats["connections_closed"] += len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            res: Dict[str, Any] = dict(self._stats)
+            res["size"] = self._size
+            res["idle"] = len(self._idle)
+            res["in_use"] = self._size - len(self._idle)
+            res["min_size"] = self.min_size
+            res["max_size"] = self.max_size
+        return res
+
+
+_POOL_CONFIG: Dict[str, Any] = {
+    "min_size": 1,
+    "max_size": 10,
+    "max_idle": 300.0,             # сек. простоя, после которых лишнее соединение закрывается
+    "max_lifetime": 3600.0,        # сек. жизни соединения до пересоздания
+    "health_check_after": 30.0,    # сек. простоя, после которых делаем SELECT 1
+    "statement_timeout_ms": 15000, # по умолчанию для каждого запроса
+    "acquire_timeout": 30.0,       # сек. ожидания свободного соединения
+}
+_pool: Optional[_Pool] = None
+_pool_lock = threading.Lock()
+
+def configure_pool(**options) -> None:
+    """
+    Меняет параметры пула (min_size, max_size, max_idle, max_lifetime,
+    health_check_after, statement_timeout_ms, acquire_timeout).
+    Текущий пул закрывается, новый создаётся при следующем запросе.
+    """
+    unknown = set(options) - set(_POOL_CONFIG)
+    if unknown:
+        raise TypeError(f"unknown pool options: {', '.join(sorted(unknown))}")
+    _POOL_CONFIG.update(options)
+    close_pool()
+
+def pool_config() -> Dict[str, Any]:
+    return dict(_POOL_CONFIG)
+
+def _get_pool() -> _Pool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _Pool(**_POOL_CONFIG)
+    return _pool
+
+def close_pool() -> None:
+    """Закрывает все свободные соединения пула (выданные закроются при возврате)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+def pool_stats() -> Dict[str, Any]:
+    """
+    Счётчики пула: checkouts, waits, wait_seconds_total/max, timeouts,
+    connections_opened/closed, health_checks/failures, size, idle, in_use.
+    """
+    if _pool is None:
+        return {}
+    return _pool.stats()
+
+@contextmanager
+def _pooled(statement_timeout_ms: Optional[int] = None):
+    """
+    Выдаёт соединение из пула на время блока with.
+    statement_timeout_ms — переопределение таймаута только для этой выдачи.
+    """
+    pool = _get_pool()
+    conn = pool.getconn()
+    broken = False
+    override = statement_timeout_ms is not None and statement_timeout_ms != pool.statement_timeout_ms
+    try:
+        if override:
+            with conn.cursor() as cur:
+                cur.execute("SET statement_timeout = %s;", (int(statement_timeout_ms),))
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        if override and not broken and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                with conn.cursor() as cur:
+                    cur.execute("SET statement_timeout = %s;", (int(pool.statement_timeout_ms or 0),))
+            except Exception:
+                broken = True
+        pool.putconn(conn, broken=broken)
+
 def _cursor(conn):
     return conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
 def _execute(sql: str, params: tuple | list | None = None) -> None:
-    conn = _connect()
-    try:
+    with _pooled() as conn:
         cur = _cursor(conn)
         cur.execute(sql, params or ())
         cur.close()
-    finally:
-        conn.close()
 
 def _query(sql: str, params: tuple | list | None = None):
-    conn = _connect()
-    try:
+    with _pooled() as conn:
         cur = _cursor(conn)
         cur.execute(sql, params or ())
         rows = cur.fetchall()
         cur.close()
         return rows
-    finally:
-        conn.close()
+
+def _query_one(sql: str, params: tuple | list | None = None):
+    with _pooled() as conn:
+        cur = _cursor(conn)
+        cur.execute(sql, params or ())
+        row = cur.fetchone()
+        cur.close()
+        return row
 
 
 def _ph(n: int) -> str:
@@ -76,11 +375,18 @@ def delete_employee(user_id: int) -> None:
 
 def init_db():
     """
-    Создаём таблицы, добавляем недостающие колонки и функцию clean_num(text).
+    Создаём таблицы, функции clean_num(text) / num_value(text), единую
+    таблицу listings (с числовыми price_num / area_num) и представления
+    old_fund / new_fund / land / commerce над ней; старые отдельные таблицы
+    переносятся в listings.
     """
-    conn = _connect()
-    cur = _cursor(conn)
+    with _pooled() as conn:
+        cur = _cursor(conn)
+        _create_schema(cur)
+        cur.close()
+
 
+def _create_schema(cur) -> None:
 # --- ACL: сотрудники с доступом ---
     cur.execute("""
     CREATE TABLE IF NOT EXISTS employees (
@@ -107,130 +413,6 @@ def init_db():
     """)
 
 
-    # таблицы
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS old_fund (
-        object_code        TEXT PRIMARY KEY,
-        realtor_code       TEXT,
-        orientir           TEXT,
-        district           TEXT,
-        komnaty            INTEGER,
-        ploshad            TEXT,
-        etazh              INTEGER,
-        etazhnost          INTEGER,
-        sanuzly            INTEGER,
-        sostoyanie         TEXT,
-        material           TEXT,
-        parkovka           TEXT,
-        dop_info           TEXT,
-        price              TEXT,
-        photos             TEXT,
-        videos             TEXT,
-        status             TEXT DEFAULT 'active',
-        created_at         TIMESTAMPTZ DEFAULT now(),
-        updated_at         TIMESTAMPTZ,
-        order_type         TEXT,
-        repost_date        TIMESTAMPTZ,
-        message_ids        TEXT,
-        old_price          TEXT,
-        initial_price      TEXT,
-        channel_message_id BIGINT
-    );
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS new_fund (
-        object_code        TEXT PRIMARY KEY,
-        realtor_code       TEXT,
-        orientir           TEXT,
-        district           TEXT,
-        jk                 TEXT,
-        year               INTEGER,
-        komnaty            INTEGER,
-        ploshad            TEXT,
-        etazh              INTEGER,
-        etazhnost          INTEGER,
-        sanuzly            INTEGER,
-        sostoyanie         TEXT,
-        material           TEXT,
-        dop_info           TEXT,
-        price              TEXT,
-        photos             TEXT,
-        videos             TEXT,
-        status             TEXT DEFAULT 'active',
-        created_at         TIMESTAMPTZ DEFAULT now(),
-        updated_at         TIMESTAMPTZ,
-        order_type         TEXT,
-        repost_date        TIMESTAMPTZ,
-        message_ids        TEXT,
-        old_price          TEXT,
-        initial_price      TEXT,
-        channel_message_id BIGINT
-    );
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS land (
-        object_code        TEXT PRIMARY KEY,
-        realtor_code       TEXT,
-        orientir           TEXT,
-        district           TEXT,
-        type               TEXT,
-        year               INTEGER,
-        ploshad_uchastok   TEXT,
-        ploshad_dom        TEXT,
-        razmer             TEXT,
-        etazhnost          INTEGER,
-        sanuzly            INTEGER,
-        sostoyanie         TEXT,
-        material           TEXT,
-        zaezd              TEXT,
-        dop_info           TEXT,
-        price              TEXT,
-        photos             TEXT,
-        videos             TEXT,
-        status             TEXT DEFAULT 'active',
-        created_at         TIMESTAMPTZ DEFAULT now(),
-        updated_at         TIMESTAMPTZ,
-        order_type         TEXT,
-        repost_date        TIMESTAMPTZ,
-        message_ids        TEXT,
-        old_price          TEXT,
-        initial_price      TEXT,
-        channel_message_id BIGINT
-    );
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS commerce (
-        object_code        TEXT PRIMARY KEY,
-        realtor_code       TEXT,
-        orientir           TEXT,
-        district           TEXT,
-        nazna4enie         TEXT,
-        raspolozhenie      TEXT,
-        etazh              INTEGER,
-        etazhnost          INTEGER,
-        ploshad_pom        TEXT,
-        ploshad_uchastok   TEXT,
-        nds                TEXT,
-        owner              TEXT,
-        dop_info           TEXT,
-        price              TEXT,
-        photos             TEXT,
-        videos             TEXT,
-        status             TEXT DEFAULT 'active',
-        created_at         TIMESTAMPTZ DEFAULT now(),
-        updated_at         TIMESTAMPTZ,
-        order_type         TEXT,
-        repost_date        TIMESTAMPTZ,
-        message_ids        TEXT,
-        old_price          TEXT,
-        initial_price      TEXT,
-        channel_message_id BIGINT
-    );
-    """)
-
     cur.execute("""
     CREATE TABLE IF NOT EXISTS client_secondary (
         id             BIGSERIAL PRIMARY KEY,
@@ -257,6 +439,70 @@ def init_db():
     );
     """)
 
+    # прогоны авторепоста: курсор и счётчики, чтобы продолжить после рестарта
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS repost_sweeps (
+        id            BIGSERIAL PRIMARY KEY,
+        status        TEXT NOT NULL DEFAULT 'running',
+        cutoff        TIMESTAMPTZ NOT NULL,
+        started_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+        updated_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+        finished_at   TIMESTAMPTZ,
+        after_date    TIMESTAMPTZ,
+        after_code    TEXT,
+        reposted      INTEGER NOT NULL DEFAULT 0,
+        skipped       INTEGER NOT NULL DEFAULT 0,
+        failed        INTEGER NOT NULL DEFAULT 0,
+        seconds       DOUBLE PRECISION NOT NULL DEFAULT 0
+    );
+    """)
+
+    # когда file_id медиа последний раз подтверждался через getFile (refresh.py)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS media_files (
+        file_id      TEXT PRIMARY KEY,
+        verified_at  TIMESTAMPTZ,
+        checked_at   TIMESTAMPTZ,
+        failures     INTEGER NOT NULL DEFAULT 0,
+        last_error   TEXT
+    );
+    """)
+    # время последней попытки (в т. ч. неудачной) — для паузы между повторами
+    cur.execute("ALTER TABLE media_files ADD COLUMN IF NOT EXISTS checked_at TIMESTAMPTZ;")
+
+    # индекс постов канала: код объекта → альбом, обложка, ссылка
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS channel_posts (
+        object_code  TEXT PRIMARY KEY,
+        message_ids  BIGINT[] NOT NULL DEFAULT '{}',
+        cover_id     BIGINT,
+        link         TEXT,
+        posted_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    """)
+
+    # очередь публикации в канал (outbox.py): объявление и задание пишутся
+    # одной транзакцией, альбом отправляет фоновый воркер
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS publish_outbox (
+        id              BIGSERIAL PRIMARY KEY,
+        object_code     TEXT NOT NULL,
+        chat_id         BIGINT,
+        media_kinds     TEXT[] NOT NULL,
+        media_ids       TEXT[] NOT NULL,
+        caption         TEXT NOT NULL DEFAULT '',
+        status          TEXT NOT NULL DEFAULT 'pending',
+        attempts        INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        claimed_until   TIMESTAMPTZ,
+        claim_token     TEXT,
+        last_error      TEXT,
+        created_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+        done_at         TIMESTAMPTZ
+    );
+    """)
+    cur.execute("ALTER TABLE publish_outbox ADD COLUMN IF NOT EXISTS claim_token TEXT;")
+
     # функция clean_num(text) → numeric
     cur.execute("""
     CREATE OR REPLACE FUNCTION clean_num(inp TEXT)
@@ -268,455 +514,605 @@ def init_db():
     $$ LANGUAGE SQL IMMUTABLE;
     """)
 
-    cur.close()
-    conn.close()
+    # функция num_value(text) → numeric: первое число из «12 500 у.е.», «45,6 м²»
+    # (clean_num склеивает все цифры и точки, поэтому «у.е.» ломает приведение)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION num_value(inp TEXT)
+    RETURNS NUMERIC AS $$
+      SELECT replace(
+               substring(replace(inp, ',', '.') FROM '[0-9][0-9 ]*(?:\\.[0-9]+)?'),
+               ' ', ''
+             )::numeric;
+    $$ LANGUAGE SQL IMMUTABLE;
+    """)
 
+    # объявления всех видов — одна таблица, вид в колонке kind
+    _create_listings(cur)
 
-# ────────────────────── утилиты ─────────────────────
+    # старые базы: old_fund / new_fund / land / commerce были отдельными таблицами
+    _migrate_legacy_tables(cur)
+
+    # old_fund / new_fund / land / commerce остаются представлениями над listings
+    for kind in LISTING_KINDS:
+        cur.execute(
+            f"CREATE OR REPLACE VIEW {kind} AS "
+            f"SELECT {', '.join(_KIND_COLUMNS[kind])} FROM listings WHERE kind='{kind}';"
+        )
 
-def _json_dump(value) -> str:
-    return json.dumps(value or [], ensure_ascii=False)
+    # последовательность для object_code (засеивается текущим максимумом)
+    cur.execute("CREATE SEQUENCE IF NOT EXISTS object_code_seq;")
+    _seed_object_code_seq(cur)
+
+    # проектный набор индексов (на существующей базе — досоздаются)
+    cur.execute("DROP INDEX IF EXISTS listings_repost_due_idx;")  # заменён listings_repost_queue_idx
+    for name, tbl, definition in INDEXES:
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {tbl} {definition};")
+
+
+# ────────────────────── listings ─────────────────────
+
+LISTING_KINDS = ("old_fund", "new_fund", "land", "commerce")
+
+# общие для всех видов поля: колонка БД → публичный (русский) ключ
+_COMMON_FIELDS = {
+    "orientir": "Ориентир",
+    "district": "Район",
+    "dop_info": "Дополнительно",
+    "price": "Цена",
+}
+
+# поля конкретного вида: колонка БД → публичный ключ
+_KIND_FIELDS: Dict[str, Dict[str, str]] = {
+    "old_fund": {
+        "komnaty": "Комнаты",
+        "ploshad": "Площадь",
+        "etazh": "Этаж",
+        "etazhnost": "Этажность",
+        "sanuzly": "Санузлы",
+        "sostoyanie": "Состояние",
+        "material": "Материал строения",
+        "parkovka": "Парковка",
+    },
+    "new_fund": {
+        "jk": "ЖК",
+        "year": "Год постройки",
+        "komnaty": "Комнаты",
+        "ploshad": "Площадь",
+        "etazh": "Этаж",
+        "etazhnost": "Этажность",
+        "sanuzly": "Санузлы",
+        "sostoyanie": "Состояние",
+        "material": "Материал строения",
+    },
+    "land": {
+        "type": "Тип недвижимости",
+        "year": "Год постройки",
+        "ploshad_uchastok": "Площадь участка",
+        "ploshad_dom": "Площадь дома",
+        "razmer": "Размер участка",
+        "etazhnost": "Этажность",
+        "sanuzly": "Санузлы",
+        "sostoyanie": "Состояние",
+        "material": "Материал строения",
+        "zaezd": "Заезд авто",
+    },
+    "commerce": {
+        "nazna4enie": "Целевое назначение",
+        "raspolozhenie": "Расположение",
+        "etazh": "Этаж",
+        "etazhnost": "Этажность",
+        "ploshad_pom": "Площадь помещения",
+        "ploshad_uchastok": "Площадь участка",
+        "nds": "Учёт НДС",
+        "owner": "Собственник",
+    },
+}
+
+# вид → текстовая колонка площади, из которой считается area_num
+_NUMERIC_SOURCES = {
+    "old_fund": "ploshad",
+    "new_fund": "ploshad",
+    "land":     "ploshad_uchastok",
+    "commerce": "ploshad_pom",
+}
+
+_INTEGER_FIELDS = {"komnaty", "etazh", "etazhnost", "sanuzly", "year"}
+
+# служебные колонки, одинаковые для всех видов
+_SERVICE_COLUMNS = (
+    "object_code", "realtor_code", "photos", "videos", "status",
+    "created_at", "updated_at", "order_type", "repost_date", "message_ids",
+    "old_price", "initial_price", "channel_message_id",
+)
+_GENERATED_COLUMNS = ("price_num", "area_num")
+
+# все «анкетные» колонки listings (объединение по видам, без повторов)
+_FIELD_COLUMNS = tuple(dict.fromkeys(
+    col for kind in LISTING_KINDS for col in (*_COMMON_FIELDS, *_KIND_FIELDS[kind])
+))
+
+# колонки, которые видны у объекта данного вида (и в одноимённом представлении)
+_KIND_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    kind: (*_SERVICE_COLUMNS, *_COMMON_FIELDS, *_KIND_FIELDS[kind], *_GENERATED_COLUMNS)
+    for kind in LISTING_KINDS
+}
+_KIND_COLUMN_SETS = {kind: frozenset(cols) for kind, cols in _KIND_COLUMNS.items()}
+
+
+def _create_listings(cur) -> None:
+    fields = ",\n        ".join(
+        f"{col:<18} {'INTEGER' if col in _INTEGER_FIELDS else 'TEXT'}" for col in _FIELD_COLUMNS
+    )
+    area_src = " ".join(f"WHEN '{kind}' THEN {col}" for kind, col in _NUMERIC_SOURCES.items())
+    kinds = ", ".join(f"'{kind}'" for kind in LISTING_KINDS)
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS listings (
+        object_code        TEXT PRIMARY KEY,
+        kind               TEXT NOT NULL CHECK (kind IN ({kinds})),
+        realtor_code       TEXT,
+        {fields},
+        photos             TEXT[] NOT NULL DEFAULT '{{}}',
+        videos             TEXT[] NOT NULL DEFAULT '{{}}',
+        status             TEXT DEFAULT 'active',
+        created_at         TIMESTAMPTZ DEFAULT now(),
+        updated_at         TIMESTAMPTZ,
+        order_type         TEXT,
+        repost_date        TIMESTAMPTZ,
+        message_ids        BIGINT[] NOT NULL DEFAULT '{{}}',
+        old_price          TEXT,
+        initial_price      TEXT,
+        channel_message_id BIGINT,
+        repost_claimed_until TIMESTAMPTZ,
+        repost_claimed_by  TEXT,
+        price_num          NUMERIC GENERATED ALWAYS AS (num_value(price)) STORED,
+        area_num           NUMERIC GENERATED ALWAYS AS (num_value(CASE kind {area_src} END)) STORED
+    );
+    """)
+    # аренда очереди репоста (list_active_objects_for_repost(claim=True))
+    cur.execute("ALTER TABLE listings ADD COLUMN IF NOT EXISTS repost_claimed_until TIMESTAMPTZ;")
+    cur.execute("ALTER TABLE listings ADD COLUMN IF NOT EXISTS repost_claimed_by TEXT;")
 
-def _parse_json(text: Optional[str]):
-    if not text:
-        return []
-    try:
-        return json.loads(text)
-    except Exception:
-        return []
+
+def _migrate_legacy_tables(cur) -> None:
+    """
+    Переносит строки из отдельных таблиц old_fund / new_fund / land / commerce
+    в listings и переименовывает их в *_legacy (удалить вручную после проверки).
+    Каждая таблица переносится в своей транзакции.
+    """
+    cur.execute("""
+        SELECT table_name
+          FROM information_schema.tables
+         WHERE table_schema = current_schema()
+           AND table_type = 'BASE TABLE'
+           AND table_name = ANY(%s);
+    """, (list(LISTING_KINDS),))
+    legacy = [r["table_name"] for r in cur.fetchall()]
+    if not legacy:
+        return
+
+    _migrate_media_columns(cur, legacy)
+
+    for tbl in legacy:
+        cur.execute("""
+            SELECT column_name
+              FROM information_schema.columns
+             WHERE table_schema = current_schema() AND table_name = %s;
+        """, (tbl,))
+        have = {r["column_name"] for r in cur.fetchall()}
+        cols = ", ".join(
+            c for c in _KIND_COLUMNS[tbl] if c in have and c not in _GENERATED_COLUMNS
+        )
+        cur.execute("BEGIN;")
+        try:
+            cur.execute(
+                f"INSERT INTO listings (kind, {cols}) SELECT %s, {cols} FROM {tbl} "
+                f"ON CONFLICT (object_code) DO NOTHING;",
+                (tbl,)
+            )
+            cur.execute(f"ALTER TABLE {tbl} RENAME TO {tbl}_legacy;")
+        except Exception:
+            cur.execute("ROLLBACK;")
+            raise
+        cur.execute("COMMIT;")
+
+
+def _migrate_media_columns(cur, tables: List[str]) -> None:
+    """
+    Однократная миграция старых баз, где photos / videos / message_ids
+    хранились JSON-строкой. Битый JSON превращается в пустой массив.
+    """
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION json_text_array(inp TEXT)
+    RETURNS TEXT[] AS $$
+    BEGIN
+      IF inp IS NULL OR btrim(inp) = '' THEN
+        RETURN '{}';
+      END IF;
+      RETURN ARRAY(SELECT jsonb_array_elements_text(inp::jsonb));
+    EXCEPTION WHEN others THEN
+      RETURN '{}';
+    END; $$ LANGUAGE plpgsql IMMUTABLE;
+    """)
+    cur.execute("""
+    CREATE OR REPLACE FUNCTION json_bigint_array(inp TEXT)
+    RETURNS BIGINT[] AS $$
+    BEGIN
+      IF inp IS NULL OR btrim(inp) = '' THEN
+        RETURN '{}';
+      END IF;
+      RETURN ARRAY(SELECT jsonb_array_elements_text(inp::jsonb)::bigint);
+    EXCEPTION WHEN others THEN
+      RETURN '{}';
+    END; $$ LANGUAGE plpgsql IMMUTABLE;
+    """)
+    cur.execute("""
+        SELECT table_name, column_name
+          FROM information_schema.columns
+         WHERE table_schema = current_schema()
+           AND table_name = ANY(%s)
+           AND column_name IN ('photos', 'videos', 'message_ids')
+           AND data_type = 'text';
+    """, (tables,))
+    for row in cur.fetchall():
+        tbl, col = row["table_name"], row["column_name"]
+        arr_type, conv = (("BIGINT[]", "json_bigint_array") if col == "message_ids"
+                          else ("TEXT[]", "json_text_array"))
+        cur.execute(
+            f"ALTER TABLE {tbl} ALTER COLUMN {col} TYPE {arr_type} USING {conv}({col});"
+        )
+        cur.execute(f"UPDATE {tbl} SET {col} = '{{}}' WHERE {col} IS NULL;")
+        cur.execute(
+            f"ALTER TABLE {tbl} ALTER COLUMN {col} SET DEFAULT '{{}}', "
+            f"ALTER COLUMN {col} SET NOT NULL;"
+        )
+
+
+# ────────────────────── индексы ─────────────────────
+
+# очередь репоста: никогда не репостнутые (NULL) идут первыми
+_REPOST_KEY = "COALESCE(repost_date, '-infinity'::timestamptz)"
+
+# (имя, таблица, определение) — всё, что создаёт init_db и проверяет check_indexes;
+# почти все выборки идут только по активным объектам → частичные индексы
+INDEXES: Tuple[Tuple[str, str, str], ...] = (
+    ("listings_active_filter_idx",   "listings", "(kind, district, order_type) WHERE status='active'"),
+    ("listings_realtor_created_idx", "listings", "(realtor_code, created_at DESC) WHERE status='active'"),
+    ("listings_repost_queue_idx",    "listings", f"({_REPOST_KEY}, object_code) WHERE status='active'"),
+    ("listings_price_num_idx",       "listings", "(kind, price_num) WHERE status='active'"),
+    ("listings_area_num_idx",        "listings", "(kind, area_num) WHERE status='active'"),
+    ("client_secondary_user_object_idx", "client_secondary", "(user_id, object_code)"),
+    ("publish_outbox_due_idx",       "publish_outbox", "(next_attempt_at, id) WHERE status='pending'"),
+    ("client_secondary_user_date_idx",   "client_secondary", "(user_id, date DESC)"),
+)
+
+def check_indexes() -> Dict[str, List[str]]:
+    """
+    Сверяет INDEXES с базой:
+      • missing — объявлены, но отсутствуют или невалидны (например, упавший
+        CREATE INDEX CONCURRENTLY);
+      • unused  — существуют, но с последнего сброса статистики по ним
+        не было ни одного idx_scan.
+    """
+    names = [ix[0] for ix in INDEXES]
+    rows = _query("""
+        SELECT c.relname AS name, i.indisvalid AS valid, COALESCE(s.idx_scan, 0) AS scans
+          FROM pg_class c
+          JOIN pg_index i ON i.indexrelid = c.oid
+          LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = c.oid
+         WHERE c.relname = ANY(%s) AND pg_table_is_visible(c.oid);
+    """, (names,))
+    found = {r["name"]: r for r in rows}
+    return {
+        "missing": [n for n in names if n not in found or not found[n]["valid"]],
+        "unused":  [n for n in names if n in found and found[n]["valid"] and not found[n]["scans"]],
+    }
+
+
+# ────────────────────── утилиты ─────────────────────
 
 def _now_iso() -> str:
     return datetime.datetime.utcnow().isoformat()
 
-def _map_common_media(d: Dict[str, Any]) -> None:
-    d["photos"] = _parse_json(d.get("photos"))
-    d["videos"] = _parse_json(d.get("videos"))
-    ids = _parse_json(d.get("message_ids"))
-    d["message_ids"] = ids
-    if not d.get("channel_message_id"):
-        # подложим первый message_id, если он есть
-        d["channel_message_id"] = ids[0] if ids else None
+_PTYPE_BY_KIND = {
+    "old_fund": "Старыйфонд",
+    "new_fund": "Новыйфонд",
+    "land":     "Участок",
+    "commerce": "Коммерция",
+}
 
-def _ptype_by_table(table: str) -> str:
-    return {
-        "old_fund": "Старыйфонд",
-        "new_fund": "Новыйфонд",
-        "land":     "Участок",
-        "commerce": "Коммерция",
-    }[table]
 
-def _add_public_fields(table: str, d: Dict[str, Any]) -> Dict[str, Any]:
+# ────────────────────── модель объекта ─────────────────────
+
+class Listing:
     """
-    Преобразует БД-поля → публичные (русские) ключи + ptype, Тип заявки,
-    не удаляя «английские» ключи (они остаются для внутреннего кода).
+    Объект из listings. На каждый вид — подкласс (LISTING_MODELS) с колонками
+    вида в __slots__; экземпляр собирается прямо из кортежа строки курсора.
+    Читается как dict и по колонке, и по публичному ключу анкеты:
+    rec["Цена"] — это rec["price"]. Ключи вне схемы (ptype, флаги подписи)
+    хранятся в _extra.
     """
-    res = dict(d)  # копия
-    res["ptype"] = _ptype_by_table(table)
-    if "order_type" in res and res["order_type"] is not None:
-        res["Тип заявки"] = res["order_type"]
-
-    if table == "old_fund":
-        mapping = {
-            "orientir": "Ориентир",
-            "district": "Район",
-            "komnaty": "Комнаты",
-            "ploshad": "Площадь",
-            "etazh": "Этаж",
-            "etazhnost": "Этажность",
-            "sanuzly": "Санузлы",
-            "sostoyanie": "Состояние",
-            "material": "Материал строения",
-            "parkovka": "Парковка",
-            "dop_info": "Дополнительно",
-            "price": "Цена",
-        }
-    elif table == "new_fund":
-        mapping = {
-            "orientir": "Ориентир",
-            "district": "Район",
-            "jk": "ЖК",
-            "year": "Год постройки",
-            "komnaty": "Комнаты",
-            "ploshad": "Площадь",
-            "etazh": "Этаж",
-            "etazhnost": "Этажность",
-            "sanuzly": "Санузлы",
-            "sostoyanie": "Состояние",
-            "material": "Материал строения",
-            "dop_info": "Дополнительно",
-            "price": "Цена",
-        }
-    elif table == "land":
-        mapping = {
-            "orientir": "Ориентир",
-            "district": "Район",
-            "type": "Тип недвижимости",
-            "year": "Год постройки",
-            "ploshad_uchastok": "Площадь участка",
-            "ploshad_dom": "Площадь дома",
-            "razmer": "Размер участка",
-            "etazhnost": "Этажность",
-            "sanuzly": "Санузлы",
-            "sostoyanie": "Состояние",
-            "material": "Материал строения",
-            "zaezd": "Заезд авто",
-            "dop_info": "Дополнительно",
-            "price": "Цена",
-        }
-    else:  # commerce
-        mapping = {
-            "orientir": "Ориентир",
-            "district": "Район",
-            "nazna4enie": "Целевое назначение",
-            "raspolozhenie": "Расположение",
-            "etazh": "Этаж",
-            "etazhnost": "Этажность",
-            "ploshad_pom": "Площадь помещения",
-            "ploshad_uchastok": "Площадь участка",
-            "nds": "Учёт НДС",
-            "owner": "Собственник",
-            "dop_info": "Дополнительно",
-            "price": "Цена",
+    __slots__ = ("_extra",)
+
+    kind: str = ""
+    ptype: str = ""
+    COLUMNS: Tuple[str, ...] = ()
+    _ALIASES: Dict[str, str] = {}                   # колонка / публичный ключ → колонка
+    _PUBLIC: Tuple[Tuple[str, str], ...] = ()       # (колонка, публичный ключ)
+
+    @classmethod
+    def from_row(cls, row: Tuple[Any, ...], pairs: Tuple[Tuple[str, int], ...]) -> "Listing":
+        obj = cls.__new__(cls)
+        obj._extra = None
+        for col, i in pairs:
+            setattr(obj, col, row[i])
+        # TEXT[] / BIGINT[] приходят из драйвера уже списками
+        obj.photos = getattr(obj, "photos", None) or []
+        obj.videos = getattr(obj, "videos", None) or []
+        obj.message_ids = ids = getattr(obj, "message_ids", None) or []
+        if not getattr(obj, "channel_message_id", None):
+            # подложим первый message_id, если он есть
+            obj.channel_message_id = ids[0] if ids else None
+        return obj
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        col = self._ALIASES.get(key)
+        if col is not None:
+            val = getattr(self, col, _MISSING)
+            # публичный ключ, как и раньше, «есть» только при непустой колонке
+            if val is _MISSING or (val is None and key != col):
+                return default
+            return val
+        if key == "ptype":
+            return self.ptype
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        val = self.get(key, _MISSING)
+        if val is _MISSING:
+            raise KeyError(key)
+        return val
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        col = self._ALIASES.get(key)
+        if col is not None:
+            setattr(self, col, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self) -> List[str]:
+        """Как у прежнего dict: загруженные колонки, заполненные публичные ключи, ptype."""
+        res = [c for c in self.COLUMNS if hasattr(self, c)]
+        res += [k for c, k in self._PUBLIC if getattr(self, c, None) is not None]
+        res.append("ptype")
+        if self._extra:
+            res += [k for k in self._extra if k not in res]
+        return res
+
+    def public(self) -> Dict[str, Any]:
+        """«Человеческий» dict для build_caption(): ptype, Тип заявки, код, район + поля анкеты."""
+        data = {
+            "ptype":       self.get("ptype"),
+            "Тип заявки":  getattr(self, "order_type", None),
+            "object_code": getattr(self, "object_code", None),
+            "district":    getattr(self, "district", None),
         }
+        for col, key in self._PUBLIC:
+            if key not in data:
+                data[key] = getattr(self, col, None)
+        return data
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {getattr(self, 'object_code', None)}>"
+
+_MISSING = object()
+
+def _make_model(kind: str) -> type:
+    cols = _KIND_COLUMNS[kind]
+    public = tuple({**_COMMON_FIELDS, **_KIND_FIELDS[kind]}.items())
+    aliases = {c: c for c in cols}
+    aliases.update({key: col for col, key in public})
+    aliases["Тип заявки"] = "order_type"
+    return type(f"{kind.title().replace('_', '')}Listing", (Listing,), {
+        "__slots__": cols,
+        "kind": kind,
+        "ptype": _PTYPE_BY_KIND[kind],
+        "COLUMNS": cols,
+        "_ALIASES": aliases,
+        "_PUBLIC": public,
+    })
+
+LISTING_MODELS: Dict[str, type] = {kind: _make_model(kind) for kind in LISTING_KINDS}
+
+# SELECT для «полной» строки: kind + объединение колонок всех видов
+_LISTING_SELECT: Tuple[str, ...] = ("kind", *dict.fromkeys(
+    col for kind in LISTING_KINDS for col in _KIND_COLUMNS[kind]
+))
+
+def _row_pairs(select: Tuple[str, ...]) -> Dict[str, Tuple[Tuple[str, int], ...]]:
+    """Вид → ((колонка, позиция в строке), ...) — только колонки этого вида."""
+    return {
+        kind: tuple((col, i) for i, col in enumerate(select) if col in _KIND_COLUMN_SETS[kind])
+        for kind in LISTING_KINDS
+    }
+
+_LISTING_PAIRS = _row_pairs(_LISTING_SELECT)
+
+def _query_listings(
+    sql: str,
+    params: tuple | list | None,
+    pairs: Dict[str, Tuple[Tuple[str, int], ...]] = _LISTING_PAIRS,
+) -> List[Listing]:
+    """SELECT kind, … → [Listing]; курсор без RealDictCursor — строки кортежами."""
+    with _pooled() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params or ())
+        rows = cur.fetchall()
+        cur.close()
+    return [LISTING_MODELS[row[0]].from_row(row, pairs[row[0]]) for row in rows]
 
-    for src, dst in mapping.items():
-        if src in res and res[src] is not None:
-            res[dst] = res[src]
 
-    _map_common_media(res)
-    return res
+# ────────────────────── AUTO-ID ─────────────────────
+
+def _seed_object_code_seq(cur) -> None:
+    """
+    Подтягивает object_code_seq к максимальному числовому коду в listings
+    (вызывается из init_db; назад последовательность не откатывается).
+    """
+    cur.execute("SELECT last_value, is_called FROM object_code_seq;")
+    seq = cur.fetchone()
+    current = seq["last_value"] if seq["is_called"] else seq["last_value"] - 1
+    cur.execute(
+        "SELECT MAX(object_code::bigint) AS mx FROM listings "
+        "WHERE object_code ~ '^[0-9]+$';"
+    )
+    row = cur.fetchone()
+    max_code = int(row["mx"]) if row and row["mx"] is not None else 0
+    if max_code > current:
+        cur.execute("SELECT setval('object_code_seq', %s, true);", (max_code,))
 
 
-# ────────────────────── AUTO-ID ─────────────────────
+class _CodeAllocator:
+    """
+    Выдаёт коды из object_code_seq. При block_size > 1 забирает сразу
+    пачку значений одним запросом и раздаёт их из памяти — серия /ad
+    не ходит в БД. Неиспользованные коды пачки при рестарте теряются
+    (в нумерации будут пропуски, дублей — нет).
+    """
+
+    def __init__(self, block_size: int = 1):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._codes: Deque[int] = collections.deque()
+
+    def next(self) -> str:
+        with self._lock:
+            if not self._codes:
+                rows = _query(
+                    "SELECT nextval('object_code_seq') AS code FROM generate_series(1, %s);",
+                    (max(1, self.block_size),)
+                )
+                self._codes.extend(int(r["code"]) for r in rows)
+            return str(self._codes.popleft())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._codes.clear()
+
+
+_code_allocator = _CodeAllocator()
+
+def configure_code_allocator(block_size: int) -> None:
+    """Сколько кодов резервировать за один запрос (1 — без пред-выделения)."""
+    _code_allocator.block_size = block_size
 
 def next_object_code() -> str:
     """
-    Следующий свободный код (максимум по всем таблицам + 1).
-    Считаем только те object_code, которые состоят из цифр.
+    Следующий свободный код из последовательности object_code_seq —
+    O(1) и без гонок между риелторами (nextval атомарен).
     """
-    conn = _connect(); cur = _cursor(conn)
-    max_code = 0
-    for tbl in ("old_fund", "new_fund", "land", "commerce"):
-        cur.execute(
-            f"SELECT MAX(object_code::int) AS mx "
-            f"FROM {tbl} WHERE object_code ~ '^[0-9]+$';"
-        )
-        row = cur.fetchone()
-        if row and row["mx"] is not None:
-            max_code = max(max_code, int(row["mx"]))
-    cur.close(); conn.close()
-    return str(max_code + 1)
+    return _code_allocator.next()
 
 
 # ────────────────────── INSERT/UPSERT ─────────────────────
 
-def insert_into_old_fund(data: dict):
-    conn = _connect(); cur = _cursor(conn)
-    msg_ids = data.get("message_ids") or []
-    ch_id = (msg_ids[0] if isinstance(msg_ids, list) and msg_ids else None)
-
-    cols = ("object_code","realtor_code","orientir","district","komnaty",
-            "ploshad","etazh","etazhnost","sanuzly","sostoyanie",
-            "material","parkovka","dop_info","price","initial_price",
-            "photos","videos","message_ids","status","order_type","channel_message_id")
-    vals = (
-        data.get("object_code"),
-        data.get("realtor_code"),
-        data.get("Ориентир"),
-        data.get("district"),
-        data.get("Комнаты"),
-        data.get("Площадь"),
-        data.get("Этаж"),
-        data.get("Этажность"),
-        data.get("Санузлы"),
-        data.get("Состояние"),
-        data.get("Материал строения"),
-        data.get("Парковка"),
-        data.get("Дополнительно"),
-        data.get("Цена"),
-        data.get("Цена"),
-        _json_dump(data.get("photos")),
-        _json_dump(data.get("videos")),
-        _json_dump(msg_ids),
-        "active",
-        data.get("Тип заявки"),
-        ch_id,
-    )
-    updates = ", ".join([f"{c}=EXCLUDED.{c}" for c in cols if c != "object_code"])
-    cur.execute(
-        f"INSERT INTO old_fund ({','.join(cols)}) VALUES ({_ph(len(cols))}) "
-        f"ON CONFLICT (object_code) DO UPDATE SET {updates};",
-        vals
-    )
-    cur.close(); conn.close()
-
-def insert_into_new_fund(data: dict):
-    conn = _connect(); cur = _cursor(conn)
-    msg_ids = data.get("message_ids") or []
-    ch_id = (msg_ids[0] if isinstance(msg_ids, list) and msg_ids else None)
-
-    cols = ("object_code","realtor_code","orientir","district","jk","year",
-            "komnaty","ploshad","etazh","etazhnost","sanuzly",
-            "sostoyanie","material","dop_info","price","initial_price",
-            "photos","videos","message_ids","status","order_type","channel_message_id")
-    vals = (
-        data.get("object_code"),
-        data.get("realtor_code"),
-        data.get("Ориентир"),
-        data.get("district"),
-        data.get("ЖК"),
-        data.get("Год постройки"),
-        data.get("Комнаты"),
-        data.get("Площадь"),
-        data.get("Этаж"),
-        data.get("Этажность"),
-        data.get("Санузлы"),
-        data.get("Состояние"),
-        data.get("Материал строения"),
-        data.get("Дополнительно"),
-        data.get("Цена"),
-        data.get("Цена"),
-        _json_dump(data.get("photos")),
-        _json_dump(data.get("videos")),
-        _json_dump(msg_ids),
-        "active",
-        data.get("Тип заявки"),
-        ch_id,
-    )
-    updates = ", ".join([f"{c}=EXCLUDED.{c}" for c in cols if c != "object_code"])
-    cur.execute(
-        f"INSERT INTO new_fund ({','.join(cols)}) VALUES ({_ph(len(cols))}) "
-        f"ON CONFLICT (object_code) DO UPDATE SET {updates};",
-        vals
-    )
-    cur.close(); conn.close()
-
-def insert_into_land(data: dict):
-    conn = _connect(); cur = _cursor(conn)
-    msg_ids = data.get("message_ids") or []
-    ch_id = (msg_ids[0] if isinstance(msg_ids, list) and msg_ids else None)
-
-    cols = ("object_code","realtor_code","orientir","district","type","year",
-            "ploshad_uchastok","ploshad_dom","razmer","etazhnost",
-            "sanuzly","sostoyanie","material","zaezd","dop_info",
-            "price","initial_price","photos","videos","message_ids","status","order_type","channel_message_id")
-    vals = (
-        data.get("object_code"),
-        data.get("realtor_code"),
-        data.get("Ориентир"),
-        data.get("district"),
-        data.get("Тип недвижимости"),
-        data.get("Год постройки"),
-        data.get("Площадь участка"),
-        data.get("Площадь дома"),
-        data.get("Размер участка"),
-        data.get("Этажность"),
-        data.get("Санузлы"),
-        data.get("Состояние"),
-        data.get("Материал строения"),
-        data.get("Заезд авто"),
-        data.get("Дополнительно"),
-        data.get("Цена"),
-        data.get("Цена"),
-        _json_dump(data.get("photos")),
-        _json_dump(data.get("videos")),
-        _json_dump(msg_ids),
-        "active",
-        data.get("Тип заявки"),
-        ch_id,
-    )
-    updates = ", ".join([f"{c}=EXCLUDED.{c}" for c in cols if c != "object_code"])
-    cur.execute(
-        f"INSERT INTO land ({','.join(cols)}) VALUES ({_ph(len(cols))}) "
-        f"ON CONFLICT (object_code) DO UPDATE SET {updates};",
-        vals
-    )
-    cur.close(); conn.close()
-
-def insert_into_commerce(data: dict):
-    conn = _connect(); cur = _cursor(conn)
-    msg_ids = data.get("message_ids") or []
-    ch_id = (msg_ids[0] if isinstance(msg_ids, list) and msg_ids else None)
-
-    purpose = data.get("Целевое назначение")
-    if isinstance(purpose, list):
-        purpose = ", ".join(purpose)
-
-    cols = ("object_code","realtor_code","orientir","district","nazna4enie",
-            "raspolozhenie","etazh","etazhnost","ploshad_pom","ploshad_uchastok",
-            "nds","owner","dop_info","price","initial_price",
-            "photos","videos","message_ids","status","order_type","channel_message_id")
-    vals = (
-        data.get("object_code"),
-        data.get("realtor_code"),
-        data.get("Ориентир"),
-        data.get("district"),
-        purpose or "",
-        data.get("Расположение"),
-        data.get("Этаж"),
-        data.get("Этажность"),
-        data.get("Площадь помещения"),
-        data.get("Площадь участка"),
-        data.get("Учёт НДС"),
-        data.get("Собственник"),
-        data.get("Дополнительно"),
-        data.get("Цена"),
-        data.get("Цена"),
-        _json_dump(data.get("photos")),
-        _json_dump(data.get("videos")),
-        _json_dump(msg_ids),
-        "active",
-        data.get("Тип заявки"),
-        ch_id,
+def _listing_upsert(kind: str, data: dict, status: str = "active") -> Tuple[str, list]:
+    """SQL и параметры для insert_listing / enqueue_publish."""
+    msg_ids = [int(m) for m in (data.get("message_ids") or [])]
+    fields = {**_COMMON_FIELDS, **_KIND_FIELDS[kind]}
+
+    values: Dict[str, Any] = {
+        "object_code": data.get("object_code"),
+        "kind": kind,
+        "realtor_code": data.get("realtor_code"),
+    }
+    # колонки чужих видов обнуляем, чтобы смена вида не оставляла хвостов
+    for col in _FIELD_COLUMNS:
+        values[col] = data.get(fields[col]) if col in fields else None
+    values["district"] = data.get("district")
+
+    if kind == "commerce":
+        purpose = data.get("Целевое назначение")
+        if isinstance(purpose, list):
+            purpose = ", ".join(purpose)
+        values["nazna4enie"] = purpose or ""
+
+    values.update(
+        initial_price=data.get("Цена"),
+        photos=list(data.get("photos") or []),
+        videos=list(data.get("videos") or []),
+        message_ids=msg_ids,
+        status=status,
+        order_type=data.get("Тип заявки"),
+        channel_message_id=msg_ids[0] if msg_ids else None,
     )
+
+    cols = list(values)
     updates = ", ".join([f"{c}=EXCLUDED.{c}" for c in cols if c != "object_code"])
-    cur.execute(
-        f"INSERT INTO commerce ({','.join(cols)}) VALUES ({_ph(len(cols))}) "
+    return (
+        f"INSERT INTO listings ({','.join(cols)}) VALUES ({_ph(len(cols))}) "
         f"ON CONFLICT (object_code) DO UPDATE SET {updates};",
-        vals
+        list(values.values())
     )
-    cur.close(); conn.close()
-
 
-# ────────────────────── UPDATE helpers ─────────────────────
-
-def update_price_old_fund(object_code: str, new_price: str):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
-        UPDATE old_fund
-           SET price=%s, updated_at=now()
-         WHERE object_code=%s;
-    """, (new_price, object_code))
-    cur.close(); conn.close()
+def insert_listing(kind: str, data: dict) -> None:
+    """
+    Сохраняет объект любого вида (data — публичные ключи, как в анкете бота).
+    Повторная вставка того же object_code перезаписывает запись целиком.
+    """
+    _execute(*_listing_upsert(kind, data))
 
-def update_price_new_fund(object_code: str, new_price: str):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
-        UPDATE new_fund
-           SET price=%s, updated_at=now()
-         WHERE object_code=%s;
-    """, (new_price, object_code))
-    cur.close(); conn.close()
 
-def update_price_land(object_code: str, new_price: str):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
-        UPDATE land
-           SET price=%s, updated_at=now()
-         WHERE object_code=%s;
-    """, (new_price, object_code))
-    cur.close(); conn.close()
+# ────────────────────── UPDATE helpers ─────────────────────
 
-def update_price_commerce(object_code: str, new_price: str):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
-        UPDATE commerce
+def update_price(object_code: str, new_price: str):
+    _execute("""
+        UPDATE listings
            SET price=%s, updated_at=now()
          WHERE object_code=%s;
     """, (new_price, object_code))
-    cur.close(); conn.close()
-
-def mark_inactive_old_fund(object_code: str):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
-        UPDATE old_fund
-           SET status='inactive', updated_at=now()
-         WHERE object_code=%s;
-    """, (object_code,))
-    cur.close(); conn.close()
-
-def mark_inactive_new_fund(object_code: str):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
-        UPDATE new_fund
-           SET status='inactive', updated_at=now()
-         WHERE object_code=%s;
-    """, (object_code,))
-    cur.close(); conn.close()
-
-def mark_inactive_land(object_code: str):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
-        UPDATE land
-           SET status='inactive', updated_at=now()
-         WHERE object_code=%s;
-    """, (object_code,))
-    cur.close(); conn.close()
 
-def mark_inactive_commerce(object_code: str):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
-        UPDATE commerce
+def mark_inactive(object_code: str):
+    _execute("""
+        UPDATE listings
            SET status='inactive', updated_at=now()
          WHERE object_code=%s;
     """, (object_code,))
-    cur.close(); conn.close()
 
-def drop_price_old_fund(object_code: str, new_price: str):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
-        UPDATE old_fund
-           SET old_price=price, price=%s, updated_at=now()
-         WHERE object_code=%s;
-    """, (new_price, object_code))
-    cur.close(); conn.close()
-
-def drop_price_new_fund(object_code: str, new_price: str):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
-        UPDATE new_fund
-           SET old_price=price, price=%s, updated_at=now()
-         WHERE object_code=%s;
-    """, (new_price, object_code))
-    cur.close(); conn.close()
-
-def drop_price_land(object_code: str, new_price: str):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
-        UPDATE land
-           SET old_price=price, price=%s, updated_at=now()
-         WHERE object_code=%s;
-    """, (new_price, object_code))
-    cur.close(); conn.close()
-
-def drop_price_commerce(object_code: str, new_price: str):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
-        UPDATE commerce
+def drop_price(object_code: str, new_price: str):
+    _execute("""
+        UPDATE listings
            SET old_price=price, price=%s, updated_at=now()
          WHERE object_code=%s;
     """, (new_price, object_code))
-    cur.close(); conn.close()
 
-def clear_old_price(table: str, object_code: str):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute(f"UPDATE {table} SET old_price=NULL, updated_at=now() WHERE object_code=%s;", (object_code,))
-    cur.close(); conn.close()
+def clear_old_price(object_code: str):
+    _execute("UPDATE listings SET old_price=NULL, updated_at=now() WHERE object_code=%s;", (object_code,))
 
-def update_message_ids_and_repost_date(table: str, object_code: str, message_ids: List[int]):
-    conn = _connect(); cur = _cursor(conn)
-    mid_json = _json_dump(message_ids)
-    ch_id = message_ids[0] if message_ids else None
-    cur.execute(
-        f"UPDATE {table} SET message_ids=%s, channel_message_id=%s, repost_date=now(), updated_at=now() "
-        f"WHERE object_code=%s;",
-        (mid_json, ch_id, object_code)
+def update_message_ids_and_repost_date(object_code: str, message_ids: List[int]):
+    ids = [int(m) for m in message_ids]
+    ch_id = ids[0] if ids else None
+    _execute(
+        "UPDATE listings SET message_ids=%s::bigint[], channel_message_id=%s, repost_date=now(), "
+        "repost_claimed_until=NULL, updated_at=now() WHERE object_code=%s;",
+        (ids, ch_id, object_code)
     )
-    cur.close(); conn.close()
 
-def update_channel_message_and_repost_date(table: str, object_code: str, message_id: int):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute(
-        f"UPDATE {table} SET channel_message_id=%s, repost_date=now(), updated_at=now() "
-        f"WHERE object_code=%s;",
+def update_channel_message_and_repost_date(object_code: str, message_id: int):
+    _execute(
+        "UPDATE listings SET channel_message_id=%s, repost_date=now(), updated_at=now() "
+        "WHERE object_code=%s;",
         (message_id, object_code)
     )
-    cur.close(); conn.close()
 
-def touch_repost_now(table: str, object_code: str):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute(f"UPDATE {table} SET repost_date=now(), updated_at=now() WHERE object_code=%s;", (object_code,))
-    cur.close(); conn.close()
+def touch_repost_now(object_code: str):
+    _execute("UPDATE listings SET repost_date=now(), updated_at=now() WHERE object_code=%s;", (object_code,))
 
 
 # ────────────────────── SEARCH helpers ─────────────────────
@@ -728,268 +1124,576 @@ def _apply_in(sql: str, params: list, column: str, values: Optional[list]) -> st
     return sql
 
 def _apply_range(sql: str, params: list, column: str, lo_key: str, hi_key: str, filters: dict) -> str:
+    """
+    Диапазон по числовой колонке: price_num / area_num (NUMERIC, с индексом)
+    или «родные» INTEGER-колонки (etazh, etazhnost).
+    """
     lo, hi = filters.get(lo_key), filters.get(hi_key)
     if lo is not None:
-        sql += f" AND clean_num({column}) >= %s"
+        sql += f" AND {column} >= %s"
         params.append(lo)
     if hi is not None:
-        sql += f" AND clean_num({column}) <= %s"
+        sql += f" AND {column} <= %s"
         params.append(hi)
     return sql
 
-def _select_by_code(table: str, object_code: str) -> Optional[Dict[str, Any]]:
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute(f"SELECT * FROM {table} WHERE object_code=%s LIMIT 1;", (object_code,))
-    row = cur.fetchone()
-    cur.close(); conn.close()
-    if not row:
-        return None
-    d = dict(row)
-    _map_common_media(d)
-    return d
-
-def _list_active_by_filters(table: str, select_cols: str, **filters) -> List[Dict[str, Any]]:
+# что отдаёт поиск списком
+_SEARCH_COLUMNS = {
+    "old_fund": "object_code, realtor_code, orientir, district, komnaty, ploshad, etazh, etazhnost, sanuzly, sostoyanie, material, parkovka, price, dop_info, photos, videos, order_type",
+    "new_fund": "object_code, realtor_code, orientir, district, jk, year, komnaty, ploshad, etazh, etazhnost, sanuzly, sostoyanie, material, price, dop_info, photos, videos, order_type",
+    "land":     "object_code, realtor_code, orientir, district, type, year, ploshad_dom, ploshad_uchastok, razmer, etazhnost, sanuzly, sostoyanie, material, zaezd, price, dop_info, photos, videos, order_type",
+    "commerce": "object_code, realtor_code, orientir, district, nazna4enie, raspolozhenie, etazh, etazhnost, ploshad_pom, ploshad_uchastok, nds, owner, price, dop_info, photos, videos, order_type",
+}
+
+# строки поиска: SELECT kind, <_SEARCH_COLUMNS[kind]>
+_SEARCH_PAIRS = {
+    kind: _row_pairs(("kind", *(c.strip() for c in cols.split(","))))[kind]
+    for kind, cols in _SEARCH_COLUMNS.items()
+}
+
+# фильтр → колонка для IN (...)
+_SEARCH_IN = {
+    "old_fund": (("condition", "sostoyanie"),),
+    "new_fund": (("condition", "sostoyanie"),),
+    "land":     (("landtype", "type"), ("condition", "sostoyanie")),
+    "commerce": (("purpose", "nazna4enie"),),
+}
+
+_AREA_RANGE  = ("area_num", "area_min", "area_max")
+_PRICE_RANGE = ("price_num", "price_min", "price_max")
+_FLAT_RANGES = (
+    _AREA_RANGE,
+    ("etazh", "floor_min", "floor_max"),
+    ("etazhnost", "floors_total_min", "floors_total_max"),
+    _PRICE_RANGE,
+)
+_SEARCH_RANGES = {
+    "old_fund": _FLAT_RANGES,
+    "new_fund": _FLAT_RANGES,
+    "land":     (_AREA_RANGE, _PRICE_RANGE),
+    "commerce": (_PRICE_RANGE,),
+}
+
+def _apply_rooms(sql: str, params: list, rooms: Optional[list]) -> str:
+    if not rooms:
+        return sql
+    nums = [r for r in rooms if r != "4+"]
+    subs = []
+    if nums:
+        subs.append(f"komnaty IN ({_ph(len(nums))})")
+        params.extend(map(int, nums))
+    if "4+" in rooms:
+        subs.append("komnaty >= 4")
+    return sql + " AND (" + " OR ".join(subs) + ")"
+
+def search_listings(kind: str, object_code: Optional[str] = None, **filters) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
     """
-    Универсальная заготовка: собирает SELECT ... FROM table WHERE status='active' + фильтры.
-    Возвращает список словарей (сырые БД ключи).
+    Два режима:
+      • search_listings('old_fund', '123') → dict одного объекта (по коду) или None.
+      • search_listings('old_fund', rooms=[...], area_min=..., ...) → список активных.
     """
-    conn = _connect(); cur = _cursor(conn)
-    sql = f"SELECT {select_cols} FROM {table} WHERE status='active'"
-    params: list[Any] = []
+    if object_code is not None:
+        found = find_object(object_code)
+        if not found or found[0] != kind:
+            return None  # type: ignore[return-value]
+        return found[1]  # type: ignore[return-value]
 
-    # Применяем общие фильтры, если переданы (детали — в конкретных функциях)
-    if table in ("old_fund", "new_fund", "land", "commerce"):
-        if filters.get("districts"):
-            sql = _apply_in(sql, params, "district", filters["districts"])
-        if filters.get("order_type"):
-            sql = _apply_in(sql, params, "order_type", [filters["order_type"]])
+    sql = f"SELECT kind, {_SEARCH_COLUMNS[kind]} FROM listings WHERE kind=%s AND status='active'"
+    params: list[Any] = [kind]
 
-    # Частные диапазоны и IN — добавляются в конкретных функциях до вызова cur.execute
-    # Здесь сразу исполнять нельзя — дочерние функции расширяют sql/params.
-    return sql, params, conn, cur  # вернём заготовку (см. ниже)
+    sql = _apply_in(sql, params, "district", filters.get("districts"))
+    if filters.get("order_type"):
+        sql = _apply_in(sql, params, "order_type", [filters["order_type"]])
+    for key, column in _SEARCH_IN[kind]:
+        sql = _apply_in(sql, params, column, filters.get(key))
+    if kind in ("old_fund", "new_fund"):
+        sql = _apply_rooms(sql, params, filters.get("rooms"))
+    for column, lo, hi in _SEARCH_RANGES[kind]:
+        sql = _apply_range(sql, params, column, lo, hi, filters)
 
-# ────────────────────── SEARCH: старый фонд ─────────────────
+    return _query_listings(sql, params, _SEARCH_PAIRS)
 
-def search_old_fund(object_code: Optional[str] = None, **filters) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
-    """
-    Два режима:
-      • search_old_fund('123') → dict одного объекта (по коду) или None.
-      • search_old_fund(rooms=[...], area_min=..., ...) → список активных.
-    """
-    table = "old_fund"
-    if object_code is not None:
-        raw = _select_by_code(table, object_code)
-        if not raw:
-            return None  # type: ignore[return-value]
-        return _add_public_fields(table, raw)  # type: ignore[return-value]
-
-    # режим списка
-    select_cols = "object_code, realtor_code, orientir, district, komnaty, ploshad, etazh, etazhnost, sanuzly, sostoyanie, material, parkovka, price, dop_info, photos, videos, order_type"
-    sql, params, conn, cur = _list_active_by_filters(table, select_cols, **filters)
-
-    # свои фильтры
-    if filters.get("condition"):
-        sql = _apply_in(sql, params, "sostoyanie", filters["condition"])
-
-    rooms = filters.get("rooms")
-    if rooms:
-        nums = [r for r in rooms if r != "4+"]
-        four = "4+" in rooms
-        subs, subp = [], []
-        if nums:
-            subs.append(f"komnaty IN ({_ph(len(nums))})")
-            subp.extend(list(map(int, nums)))
-        if four:
-            subs.append("komnaty >= 4")
-        if subs:
-            sql += " AND (" + " OR ".join(subs) + ")"
-            params.extend(subp)
-
-    for col, lo, hi in (
-        ("ploshad","area_min","area_max"),
-        ("etazh","floor_min","floor_max"),
-        ("etazhnost","floors_total_min","floors_total_max"),
-        ("price","price_min","price_max"),
-    ):
-        sql = _apply_range(sql, params, col, lo, hi, filters)
+def search_old_fund(object_code: Optional[str] = None, **filters):
+    return search_listings("old_fund", object_code, **filters)
 
-    cur.execute(sql, params)
-    rows = cur.fetchall()
-    cur.close(); conn.close()
+def search_new_fund(object_code: Optional[str] = None, **filters):
+    return search_listings("new_fund", object_code, **filters)
 
-    res: List[Dict[str, Any]] = []
-    for r in rows:
-        d = dict(r)
-        res.append(_add_public_fields(table, d))
-    return res
+def search_land(object_code: Optional[str] = None, **filters):
+    return search_listings("land", object_code, **filters)
 
-# ────────────────────── SEARCH: новый фонд ─────────────────
+def search_commerce(object_code: Optional[str] = None, **filters):
+    return search_listings("commerce", object_code, **filters)
 
-def search_new_fund(object_code: Optional[str] = None, **filters) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
-    table = "new_fund"
-    if object_code is not None:
-        raw = _select_by_code(table, object_code)
-        if not raw:
-            return None  # type: ignore[return-value]
-        return _add_public_fields(table, raw)  # type: ignore[return-value]
-
-    select_cols = "object_code, realtor_code, orientir, district, jk, year, komnaty, ploshad, etazh, etazhnost, sanuzly, sostoyanie, material, price, dop_info, photos, videos, order_type"
-    sql, params, conn, cur = _list_active_by_filters(table, select_cols, **filters)
-
-    if filters.get("condition"):
-        sql = _apply_in(sql, params, "sostoyanie", filters["condition"])
-
-    rooms = filters.get("rooms")
-    if rooms:
-        nums = [r for r in rooms if r != "4+"]
-        four = "4+" in rooms
-        subs, subp = [], []
-        if nums:
-            subs.append(f"komnaty IN ({_ph(len(nums))})")
-            subp.extend(list(map(int, nums)))
-        if four:
-            subs.append("komnaty >= 4")
-        if subs:
-            sql += " AND (" + " OR ".join(subs) + ")"
-            params.extend(subp)
-
-    for col, lo, hi in (
-        ("ploshad","area_min","area_max"),
-        ("etazh","floor_min","floor_max"),
-        ("etazhnost","floors_total_min","floors_total_max"),
-        ("price","price_min","price_max"),
-    ):
-        sql = _apply_range(sql, params, col, lo, hi, filters)
 
-    cur.execute(sql, params)
-    rows = cur.fetchall()
-    cur.close(); conn.close()
+# ────────────────────── Поиск по коду ─────────────────────
 
-    res: List[Dict[str, Any]] = []
-    for r in rows:
-        d = dict(r)
-        res.append(_add_public_fields(table, d))
-    return res
+def find_object(object_code: str, *, active_only: bool = False) -> Optional[Tuple[str, Listing]]:
+    """
+    Ищет объект по коду (первичный ключ listings). Возвращает (kind, rec),
+    где rec — Listing (читается и по колонкам, и по русским ключам), либо None.
+    """
+    status = " AND status='active'" if active_only else ""
+    rows = _query_listings(
+        f"SELECT {', '.join(_LISTING_SELECT)} FROM listings WHERE object_code=%s{status};",
+        (object_code,)
+    )
+    if not rows:
+        return None
+    return rows[0].kind, rows[0]
 
-# ────────────────────── SEARCH: участок ─────────────────
 
-def search_land(object_code: Optional[str] = None, **filters) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
-    table = "land"
-    if object_code is not None:
-        raw = _select_by_code(table, object_code)
-        if not raw:
-            return None  # type: ignore[return-value]
-        return _add_public_fields(table, raw)  # type: ignore[return-value]
+# ────────────────────── Служебные выборки для основного бота ─────────────────────
 
-    select_cols = "object_code, realtor_code, orientir, district, type, year, ploshad_dom, ploshad_uchastok, razmer, etazhnost, sanuzly, sostoyanie, material, zaezd, price, dop_info, photos, videos, order_type"
-    sql, params, conn, cur = _list_active_by_filters(table, select_cols, **filters)
+def exists_active_object_code(object_code: str) -> bool:
+    row = _query_one(
+        "SELECT 1 FROM listings WHERE object_code=%s AND status='active';",
+        (object_code,)
+    )
+    return row is not None
 
-    if filters.get("landtype"):
-        sql = _apply_in(sql, params, "type", filters["landtype"])
-    if filters.get("condition"):
-        sql = _apply_in(sql, params, "sostoyanie", filters["condition"])
+def list_active_by_realtor(realtor_code: str) -> List[Tuple[str, Listing]]:
+    """
+    Список активных объектов по риелтору (новые сверху):
+    возвращает [('old_fund', rec), ...], где rec — Listing (media/message_ids — списки).
+    """
+    rows = _query_listings(
+        f"SELECT {', '.join(_LISTING_SELECT)} FROM listings "
+        f"WHERE realtor_code=%s AND status='active' ORDER BY created_at DESC;",
+        (realtor_code,)
+    )
+    return [(rec.kind, rec) for rec in rows]
+
+def _utc(dt: datetime.datetime) -> datetime.datetime:
+    # наивное время в коде бота — это utcnow()
+    return dt if dt.tzinfo else dt.replace(tzinfo=datetime.timezone.utc)
+
+def list_active_objects_for_repost(
+    cutoff_iso: str,
+    *,
+    limit: Optional[int] = None,
+    after: Optional[Tuple[Optional[str], str]] = None,
+    claim: bool = False,
+    lease_seconds: int = 600,
+    owner: Optional[str] = None,
+) -> List[Tuple[str, str, Optional[str]]]:
+    """
+    Возвращает [('old_fund', object_code, repost_date_iso_or_None), ...]
+    для тех, у кого repost_date пуст или < cutoff_iso — самые давние первыми
+    (ни разу не репостнутые — в самом начале).
+
+      • limit — размер пачки;
+      • after — (repost_date_iso_or_None, object_code) последней строки
+        предыдущей пачки: продолжить с неё (keyset, без OFFSET);
+      • claim — забрать пачку себе: строки, занятые другими воркерами
+        (FOR UPDATE SKIP LOCKED или неистёкшая аренда), пропускаются, а выданные
+        арендуются на lease_seconds за воркером owner. Аренду продлевает
+        renew_repost_claims(), снимает успешный репост
+        (update_message_ids_and_repost_date) или release_repost_claims().
+    """
+    where = f"status='active' AND {_REPOST_KEY} < %s"
+    params: list[Any] = [_utc(datetime.datetime.fromisoformat(cutoff_iso))]
+    if after is not None:
+        last_date, last_code = after
+        where += f" AND ({_REPOST_KEY}, object_code) > (%s, %s)"
+        params += [
+            _utc(datetime.datetime.fromisoformat(last_date)) if last_date else "-infinity",
+            last_code,
+        ]
+    order = f"ORDER BY {_REPOST_KEY}, object_code"
+    limit_sql = ""
+    if limit is not None:
+        limit_sql = " LIMIT %s"
+        params.append(int(limit))
+
+    if claim:
+        rows = _query(f"""
+            UPDATE listings
+               SET repost_claimed_until = now() + make_interval(secs => %s),
+                   repost_claimed_by = %s
+             WHERE object_code IN (
+                   SELECT object_code FROM listings
+                    WHERE {where}
+                      AND (repost_claimed_until IS NULL OR repost_claimed_until < now())
+                    {order}{limit_sql}
+                      FOR UPDATE SKIP LOCKED)
+         RETURNING kind, object_code, repost_date;
+        """, [lease_seconds, owner, *params])
+        # RETURNING не сохраняет порядок подзапроса
+        epoch = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+        rows.sort(key=lambda r: (r["repost_date"] or epoch, r["object_code"]))
+    else:
+        rows = _query(
+            f"SELECT kind, object_code, repost_date FROM listings WHERE {where} {order}{limit_sql};",
+            params
+        )
+    return [
+        (r["kind"], r["object_code"], r["repost_date"].isoformat() if r["repost_date"] else None)
+        for r in rows
+    ]
 
-    sql = _apply_range(sql, params, "ploshad_uchastok", "area_min", "area_max", filters)
-    sql = _apply_range(sql, params, "price", "price_min", "price_max", filters)
+def renew_repost_claims(object_codes: List[str], owner: str, lease_seconds: int) -> List[str]:
+    """
+    Продлевает аренду owner на объекты object_codes. Возвращает коды, которые
+    всё ещё за ним: истёкшая аренда могла уйти другому воркеру — такие
+    объекты репостить нельзя.
+    """
+    if not object_codes:
+        return []
+    rows = _query("""
+        UPDATE listings
+           SET repost_claimed_until = now() + make_interval(secs => %s)
+         WHERE object_code = ANY(%s)
+           AND repost_claimed_by = %s
+           AND repost_claimed_until > now()
+     RETURNING object_code;
+    """, (lease_seconds, list(object_codes), owner))
+    return [r["object_code"] for r in rows]
+
+def release_repost_claims(object_codes: List[str], owner: Optional[str] = None) -> None:
+    """Снимает аренду с объектов, которые воркер так и не репостнул (только свою, если задан owner)."""
+    if not object_codes:
+        return
+    if owner is None:
+        _execute(
+            "UPDATE listings SET repost_claimed_until=NULL WHERE object_code = ANY(%s);",
+            (list(object_codes),)
+        )
+    else:
+        _execute(
+            "UPDATE listings SET repost_claimed_until=NULL "
+            "WHERE object_code = ANY(%s) AND repost_claimed_by = %s;",
+            (list(object_codes), owner)
+        )
 
-    cur.execute(sql, params)
-    rows = cur.fetchall()
-    cur.close(); conn.close()
+# ────────────────────── прогоны авторепоста ─────────────────────
 
-    res: List[Dict[str, Any]] = []
-    for r in rows:
-        d = dict(r)
-        res.append(_add_public_fields(table, d))
-    return res
+def start_repost_sweep(cutoff_iso: str) -> Dict[str, Any]:
+    """
+    Незавершённый прогон (если процесс упал посреди него) или новый.
+    В ответе — id, cutoff, курсор after_date/after_code и счётчики.
+    Один прогон могут вести несколько воркеров сразу: пересечения исключает
+    аренда объектов, а checkpoint_repost_sweep() только прибавляет к счётчикам.
+    """
+    row = _query_one(
+        "SELECT * FROM repost_sweeps WHERE status='running' ORDER BY id DESC LIMIT 1;"
+    )
+    if row is None:
+        row = _query_one(
+            "INSERT INTO repost_sweeps (cutoff) VALUES (%s) RETURNING *;",
+            (_utc(datetime.datetime.fromisoformat(cutoff_iso)),)
+        )
+    return dict(row)
+
+def checkpoint_repost_sweep(
+    sweep_id: int,
+    after: Tuple[Optional[str], str],
+    reposted: int,
+    skipped: int,
+    failed: int,
+    seconds: float,
+) -> Dict[str, Any]:
+    """
+    Прибавляет к счётчикам прогона итоги пачки (reposted/skipped/failed/seconds —
+    приращения, не итог) и двигает курсор, но только вперёд: воркеры,
+    ведущие прогон параллельно, не затирают друг друга. Возвращает строку
+    прогона с накопленными значениями.
+    """
+    after_date, after_code = after
+    after_date = _utc(datetime.datetime.fromisoformat(after_date)) if after_date else None
+    # все выражения SET видят старую строку — условие «вперёд» одно на обе колонки
+    ahead = ("(after_code IS NULL OR (COALESCE(after_date, '-infinity'), after_code)"
+             " < (COALESCE(%s::timestamptz, '-infinity'), %s))")
+    row = _query_one(f"""
+        UPDATE repost_sweeps
+           SET after_date = CASE WHEN {ahead} THEN %s::timestamptz ELSE after_date END,
+               after_code = CASE WHEN {ahead} THEN %s ELSE after_code END,
+               reposted = reposted + %s, skipped = skipped + %s, failed = failed + %s,
+               seconds = seconds + %s, updated_at = now()
+         WHERE id=%s
+     RETURNING *;
+    """, (after_date, after_code, after_date, after_date, after_code, after_code,
+          reposted, skipped, failed, seconds, sweep_id))
+    return dict(row) if row else {}
+
+def finish_repost_sweep(sweep_id: int) -> None:
+    _execute(
+        "UPDATE repost_sweeps SET status='done', finished_at=now(), updated_at=now() WHERE id=%s;",
+        (sweep_id,)
+    )
 
-# ────────────────────── SEARCH: коммерция ────────────────
+def list_active_without_media() -> List[Tuple[str, str]]:
+    """[('old_fund', object_code), ...] — активные объекты без фото и видео."""
+    rows = _query(
+        "SELECT kind, object_code FROM listings "
+        "WHERE status='active' AND cardinality(photos) = 0 AND cardinality(videos) = 0;"
+    )
+    return [(r["kind"], r["object_code"]) for r in rows]
 
-def search_commerce(object_code: Optional[str] = None, **filters) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
-    table = "commerce"
-    if object_code is not None:
-        raw = _select_by_code(table, object_code)
-        if not raw:
-            return None  # type: ignore[return-value]
-        return _add_public_fields(table, raw)  # type: ignore[return-value]
+# ────────────────────── индекс постов канала ─────────────────────
 
-    select_cols = "object_code, realtor_code, orientir, district, nazna4enie, raspolozhenie, etazh, etazhnost, ploshad_pom, ploshad_uchastok, nds, owner, price, dop_info, photos, videos, order_type"
-    sql, params, conn, cur = _list_active_by_filters(table, select_cols, **filters)
+def upsert_channel_posts(posts: List[Tuple[str, List[int], int, str, datetime.datetime]]) -> None:
+    """
+    Пачка (object_code, message_ids, cover_id, link, posted_at) одним запросом.
+    Тот же пост (та же обложка) — message_ids объединяются (альбом приходит
+    по частям), новый пост заменяет старый; более старые данные не затирают новые.
+    """
+    if not posts:
+        return
+    with _pooled() as conn:
+        cur = _cursor(conn)
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO channel_posts (object_code, message_ids, cover_id, link, posted_at)
+            VALUES %s
+            ON CONFLICT (object_code) DO UPDATE SET
+                message_ids = CASE
+                    WHEN channel_posts.cover_id = EXCLUDED.cover_id
+                    THEN ARRAY(SELECT DISTINCT m FROM unnest(channel_posts.message_ids || EXCLUDED.message_ids) m ORDER BY m)
+                    ELSE EXCLUDED.message_ids
+                END,
+                cover_id  = EXCLUDED.cover_id,
+                link      = EXCLUDED.link,
+                posted_at = EXCLUDED.posted_at
+            WHERE channel_posts.posted_at <= EXCLUDED.posted_at;
+        """, [(code, [int(m) for m in ids], cover, link, posted_at)
+              for code, ids, cover, link, posted_at in posts],
+            template="(%s, %s::bigint[], %s, %s, %s)")
+        cur.close()
 
-    if filters.get("purpose"):
-        sql = _apply_in(sql, params, "nazna4enie", filters["purpose"])
-    sql = _apply_range(sql, params, "price", "price_min", "price_max", filters)
+def get_channel_post(object_code: str) -> Optional[Dict[str, Any]]:
+    """Пост активного объекта из индекса (message_ids, cover_id, link, posted_at) или None."""
+    row = _query_one("""
+        SELECT p.object_code, p.message_ids, p.cover_id, p.link, p.posted_at
+          FROM channel_posts p
+          JOIN listings l USING (object_code)
+         WHERE p.object_code=%s AND l.status='active';
+    """, (object_code,))
+    return dict(row) if row else None
 
-    cur.execute(sql, params)
-    rows = cur.fetchall()
-    cur.close(); conn.close()
 
-    res: List[Dict[str, Any]] = []
-    for r in rows:
-        d = dict(r)
-        res.append(_add_public_fields(table, d))
-    return res
+# ────────────────────── очередь публикации (outbox.py) ─────────────────────
 
+def enqueue_publish(
+    kind: str,
+    data: dict,
+    chat_id: Optional[int],
+    media: List[Tuple[str, str]],
+    caption: str,
+) -> int:
+    """
+    Одной транзакцией: объявление (status='pending' — в поиск и авторепост
+    не попадает) и задание на публикацию альбома media [(вид, file_id)]
+    с подписью caption. chat_id — кого уведомить о результате. Возвращает id задания.
+    """
+    sql, params = _listing_upsert(kind, data, status="pending")
+    with _pooled() as conn:
+        cur = _cursor(conn)
+        cur.execute("BEGIN;")
+        try:
+            cur.execute(sql, params)
+            cur.execute("""
+                INSERT INTO publish_outbox (object_code, chat_id, media_kinds, media_ids, caption)
+                VALUES (%s, %s, %s, %s, %s) RETURNING id;
+            """, (data.get("object_code"), chat_id,
+                  [k for k, _ in media], [f for _, f in media], caption or ""))
+            job_id = cur.fetchone()["id"]
+        except Exception:
+            cur.execute("ROLLBACK;")
+            raise
+        cur.execute("COMMIT;")
+        cur.close()
+    return job_id
 
-# ────────────────────── Служебные выборки для основного бота ─────────────────────
+def claim_publish_jobs(
+    limit: int, lease_seconds: int = 300, claim_token: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Забирает до limit созревших заданий (старые первыми) и арендует их на
+    lease_seconds за claim_token; attempts увеличивается сразу — падение
+    воркера тоже попытка.
+    """
+    rows = _query("""
+        UPDATE publish_outbox
+           SET claimed_until = now() + make_interval(secs => %s),
+               claim_token = %s,
+               attempts = attempts + 1
+         WHERE id IN (
+               SELECT id FROM publish_outbox
+                WHERE status='pending' AND next_attempt_at <= now()
+                  AND (claimed_until IS NULL OR claimed_until < now())
+                ORDER BY next_attempt_at, id
+                LIMIT %s
+                  FOR UPDATE SKIP LOCKED)
+     RETURNING *;
+    """, (lease_seconds, claim_token, int(limit)))
+    return sorted((dict(r) for r in rows), key=lambda r: r["id"])
+
+def renew_publish_job(job_id: int, claim_token: str, lease_seconds: int) -> bool:
+    """
+    Продлевает аренду задания перед самой отправкой альбома. False — аренда
+    истекла и задание уже у другого воркера (или снято): отправлять нельзя.
+    """
+    row = _query_one("""
+        UPDATE publish_outbox
+           SET claimed_until = now() + make_interval(secs => %s)
+         WHERE id = %s AND claim_token = %s AND status = 'pending'
+     RETURNING id;
+    """, (lease_seconds, job_id, claim_token))
+    return row is not None
+
+def complete_publish_jobs(
+    done: List[Tuple[int, str, List[int]]], claim_token: Optional[str] = None
+) -> List[int]:
+    """
+    Пачка (job_id, object_code, message_ids) опубликованных альбомов:
+    message_ids и repost_date в listings, объявление становится активным
+    (если его не сняли, пока оно ждало в очереди), задания — 'done'.
+    С claim_token завершаются только задания, аренда которых всё ещё за ним.
+    Возвращает id завершённых заданий.
+    """
+    if not done:
+        return []
+    with _pooled() as conn:
+        cur = _cursor(conn)
+        cur.execute("BEGIN;")
+        try:
+            cur.execute("""
+                UPDATE publish_outbox
+                   SET status='done', done_at=now(), claimed_until=NULL, last_error=NULL
+                 WHERE id = ANY(%s) AND status = 'pending'
+                   AND (%s::text IS NULL OR claim_token = %s)
+             RETURNING id;
+            """, ([job_id for job_id, _, _ in done], claim_token, claim_token))
+            completed = {r["id"] for r in cur.fetchall()}
+            rows = [(code, [int(m) for m in ids]) for job_id, code, ids in done if job_id in completed]
+            if rows:
+                psycopg2.extras.execute_values(cur, """
+                    UPDATE listings l
+                       SET message_ids = d.ids, channel_message_id = d.ids[1],
+                           repost_date = now(), repost_claimed_until = NULL, updated_at = now(),
+                           status = CASE WHEN l.status = 'pending' THEN 'active' ELSE l.status END
+                      FROM (VALUES %s) AS d(object_code, ids)
+                     WHERE l.object_code = d.object_code;
+                """, rows, template="(%s, %s::bigint[])")
+        except Exception:
+            cur.execute("ROLLBACK;")
+            raise
+        cur.execute("COMMIT;")
+        cur.close()
+    return sorted(completed)
+
+def fail_publish_job(
+    job_id: int, error: str, retry_in: Optional[float] = None, claim_token: Optional[str] = None
+) -> None:
+    """
+    Неудачная попытка: retry_in секунд — повторить позже; None — задание
+    окончательно 'failed', ожидавшее объявление снимается (status='inactive').
+    С claim_token — только если задание всё ещё арендовано за ним.
+    """
+    if retry_in is not None:
+        _execute("""
+            UPDATE publish_outbox
+               SET next_attempt_at = now() + make_interval(secs => %s),
+                   claimed_until = NULL, last_error = %s
+             WHERE id = %s AND status = 'pending'
+               AND (%s::text IS NULL OR claim_token = %s);
+        """, (float(retry_in), error, job_id, claim_token, claim_token))
+        return
+    _execute("""
+        WITH j AS (
+            UPDATE publish_outbox
+               SET status='failed', claimed_until=NULL, last_error=%s, done_at=now()
+             WHERE id=%s AND status = 'pending'
+               AND (%s::text IS NULL OR claim_token = %s)
+         RETURNING object_code)
+        UPDATE listings SET status='inactive', updated_at=now()
+         WHERE object_code IN (SELECT object_code FROM j) AND status='pending';
+    """, (error, job_id, claim_token, claim_token))
 
-def exists_active_object_code(object_code: str) -> bool:
-    conn = _connect(); cur = _cursor(conn)
-    for tbl in ("old_fund", "new_fund", "land", "commerce"):
-        cur.execute(f"SELECT 1 FROM {tbl} WHERE object_code=%s AND status='active' LIMIT 1;", (object_code,))
-        if cur.fetchone():
-            cur.close(); conn.close()
-            return True
-    cur.close(); conn.close()
-    return False
 
-def list_active_by_realtor(realtor_code: str) -> List[Tuple[str, Dict[str, Any]]]:
+# ────────────────────── проверка file_id (refresh.py) ─────────────────────
+
+MEDIA_RETRY_MAX_HOURS = 7 * 24    # пауза перед повтором неудачной проверки: 2^failures ч, не больше недели
+
+def list_stale_media(stale_before_iso: str, limit: int) -> List[str]:
     """
-    Список активных объектов по риелтору:
-    возвращает [('old_fund', rec), ...], где rec — row из БД с распарсенными media/message_ids.
+    file_id фото/видео активных объектов, которые ни разу не проверялись
+    или проверялись раньше stale_before_iso — давно не проверенные первыми.
+    Неудачные повторяются не раньше чем через 2^failures часов и идут
+    после остальных: битые file_id не должны съедать limit каждого прогона.
     """
-    conn = _connect(); cur = _cursor(conn)
-    out: List[Tuple[str, Dict[str, Any]]] = []
-    for tbl in ("old_fund", "new_fund", "land", "commerce"):
-        cur.execute(
-            f"SELECT * FROM {tbl} WHERE realtor_code=%s AND status='active' ORDER BY created_at DESC;",
-            (realtor_code,)
-        )
-        rows = cur.fetchall()
-        for r in rows:
-            d = dict(r)
-            _map_common_media(d)
-            out.append((tbl, d))
-    cur.close(); conn.close()
-    return out
-
-def list_active_objects_for_repost(cutoff_iso: str) -> List[Tuple[str, str, Optional[str]]]:
+    rows = _query("""
+        SELECT f.file_id
+          FROM (SELECT DISTINCT unnest(photos || videos) AS file_id
+                  FROM listings WHERE status='active') f
+          LEFT JOIN media_files m USING (file_id)
+         WHERE (m.verified_at IS NULL OR m.verified_at < %s)
+           AND (COALESCE(m.failures, 0) = 0 OR m.checked_at IS NULL
+                OR m.checked_at < now() - make_interval(
+                       hours => LEAST(power(2, LEAST(m.failures, 16))::int, %s)))
+         ORDER BY COALESCE(m.failures, 0), m.verified_at NULLS FIRST, m.checked_at NULLS FIRST
+         LIMIT %s;
+    """, (_utc(datetime.datetime.fromisoformat(stale_before_iso)), MEDIA_RETRY_MAX_HOURS, int(limit)))
+    return [r["file_id"] for r in rows]
+
+def save_media_checks(
+    verified: List[str],
+    replaced: Dict[str, str],
+    failed: Dict[str, str],
+) -> int:
     """
-    Возвращает [('old_fund', object_code, repost_date_iso_or_None), ...]
-    для тех, у кого repost_date пуст или < cutoff_iso.
+    Записывает результаты пачки проверок (не больше трёх запросов):
+      • verified — file_id подтверждены (включая новые id из replaced);
+      • replaced — старый file_id → новый: подменяется в photos / videos
+        с сохранением порядка;
+      • failed   — file_id → текст ошибки (verified_at не трогаем; повтор
+        с паузой по числу неудач, см. list_stale_media).
+    Возвращает число объектов, у которых поменялись медиа.
     """
-    cutoff = datetime.datetime.fromisoformat(cutoff_iso)
-    conn = _connect(); cur = _cursor(conn)
-    out: List[Tuple[str, str, Optional[str]]] = []
-    for tbl in ("old_fund", "new_fund", "land", "commerce"):
-        cur.execute(
-            f"SELECT object_code, repost_date FROM {tbl} WHERE status='active';"
-        )
-        for row in cur.fetchall():
-            rdate = row["repost_date"]
-            if (rdate is None) or (rdate < cutoff):
-                out.append((tbl, row["object_code"], rdate.isoformat() if rdate else None))
-    cur.close(); conn.close()
-    return out
+    ok = list(dict.fromkeys([*verified, *replaced.values()]))
+    changed = 0
+    with _pooled() as conn:
+        cur = _cursor(conn)
+        if ok:
+            cur.execute("""
+                INSERT INTO media_files (file_id, verified_at, checked_at)
+                SELECT unnest(%s::text[]), now(), now()
+                ON CONFLICT (file_id) DO UPDATE
+                   SET verified_at=now(), checked_at=now(), failures=0, last_error=NULL;
+            """, (ok,))
+        if replaced:
+            cur.execute("""
+                WITH m(old_id, new_id) AS (SELECT * FROM unnest(%s::text[], %s::text[]))
+                UPDATE listings l
+                   SET photos = ARRAY(SELECT COALESCE(m.new_id, x.fid)
+                                        FROM unnest(l.photos) WITH ORDINALITY x(fid, ord)
+                                        LEFT JOIN m ON m.old_id = x.fid
+                                       ORDER BY x.ord),
+                       videos = ARRAY(SELECT COALESCE(m.new_id, x.fid)
+                                        FROM unnest(l.videos) WITH ORDINALITY x(fid, ord)
+                                        LEFT JOIN m ON m.old_id = x.fid
+                                       ORDER BY x.ord),
+                       updated_at = now()
+                 WHERE l.photos && %s::text[] OR l.videos && %s::text[];
+            """, (list(replaced), list(replaced.values()), list(replaced), list(replaced)))
+            changed = cur.rowcount
+        if failed:
+            cur.execute("""
+                INSERT INTO media_files (file_id, checked_at, failures, last_error)
+                SELECT unnest(%s::text[]), now(), 1, unnest(%s::text[])
+                ON CONFLICT (file_id) DO UPDATE
+                   SET checked_at=now(), failures=media_files.failures + 1,
+                       last_error=EXCLUDED.last_error;
+            """, (list(failed), list(failed.values())))
+        cur.close()
+    return changed
 
 def client_secondary_exists(user_id: int, object_code: str) -> bool:
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute(
+    row = _query_one(
         "SELECT 1 FROM client_secondary WHERE user_id=%s AND object_code=%s LIMIT 1;",
         (user_id, object_code)
     )
-    ok = cur.fetchone() is not None
-    cur.close(); conn.close()
-    return ok
+    return row is not None
 
 
 # ────────────────────── clients ───────────────────────────
@@ -1003,33 +1707,25 @@ def insert_client_secondary(
     object_code: str,
     realtor_code: str
 ):
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
+    _execute("""
         INSERT INTO client_secondary (
             user_id, phone, username, telegram_name,
             client_name, object_code, realtor_code
         ) VALUES (%s, %s, %s, %s, %s, %s, %s);
     """, (user_id, phone, username, telegram_name, client_name, object_code, realtor_code))
-    cur.close(); conn.close()
 
 def get_last_client_secondary(user_id: int) -> Optional[tuple[str, str]]:
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
+    row = _query_one("""
         SELECT client_name, phone
           FROM client_secondary
          WHERE user_id=%s
          ORDER BY date DESC
          LIMIT 1;
     """, (user_id,))
-    row = cur.fetchone()
-    cur.close(); conn.close()
     return (row["client_name"], row["phone"]) if row else None
 
 def get_client_base(user_id: int) -> Optional[Dict[str, Any]]:
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("SELECT * FROM client_base WHERE user_id=%s;", (user_id,))
-    row = cur.fetchone()
-    cur.close(); conn.close()
+    row = _query_one("SELECT * FROM client_base WHERE user_id=%s;", (user_id,))
     return dict(row) if row else None
 
 def upsert_client_base(
@@ -1040,8 +1736,7 @@ def upsert_client_base(
     client_name: str
 ):
     now = _now_iso()
-    conn = _connect(); cur = _cursor(conn)
-    cur.execute("""
+    _execute("""
         INSERT INTO client_base (date, user_id, phone, username, telegram_name, client_name)
         VALUES (%s, %s, %s, %s, %s, %s)
         ON CONFLICT (user_id) DO UPDATE SET
@@ -1051,7 +1746,6 @@ def upsert_client_base(
             client_name=EXCLUDED.client_name,
             date=EXCLUDED.date;
     """, (now, user_id, phone, username, telegram_name, client_name))
-    cur.close(); conn.close()
 
 
 # ────────────────────── misc ──────────────────────────────
@@ -0,0 +1,116 @@
+# db_async.py
+# Асинхронный фасад над db.py: те же имена функций, но корутины.
+#
+# Каждый вызов выполняется в отдельном пуле потоков (размер = max_size пула
+# соединений), поэтому медленный запрос не блокирует event loop бота,
+# а запросы разных пользователей идут параллельно.
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+import db
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=db.pool_config()["max_size"],
+                    thread_name_prefix="db",
+                )
+    return _executor
+
+def _shutdown_sync() -> None:
+    global _executor
+    with _executor_lock:
+        ex, _executor = _executor, None
+    if ex is not None:
+        ex.shutdown(wait=True)
+    db.close_pool()
+
+async def shutdown() -> None:
+    """
+    Останавливает пул потоков и закрывает соединения БД. Ожидание
+    незавершённых запросов идёт в отдельном потоке, а не в event loop.
+    """
+    await asyncio.to_thread(_shutdown_sync)
+
+async def run(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Выполняет синхронную функцию БД в пуле потоков."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+
+def _offload(fn: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs) -> Any:
+        return await run(fn, *args, **kwargs)
+    return wrapper
+
+
+# ────────────────────── публичное API (зеркало db.py) ──────────────────────
+
+init_db = _offload(db.init_db)
+check_indexes = _offload(db.check_indexes)
+pool_stats = db.pool_stats                      # только счётчики в памяти — без потока
+
+list_employees   = _offload(db.list_employees)
+get_employee_name = _offload(db.get_employee_name)
+upsert_employee  = _offload(db.upsert_employee)
+delete_employee  = _offload(db.delete_employee)
+
+next_object_code = _offload(db.next_object_code)
+
+insert_listing = _offload(db.insert_listing)
+
+update_price  = _offload(db.update_price)
+mark_inactive = _offload(db.mark_inactive)
+drop_price    = _offload(db.drop_price)
+
+clear_old_price                        = _offload(db.clear_old_price)
+update_message_ids_and_repost_date     = _offload(db.update_message_ids_and_repost_date)
+update_channel_message_and_repost_date = _offload(db.update_channel_message_and_repost_date)
+touch_repost_now                       = _offload(db.touch_repost_now)
+
+search_listings = _offload(db.search_listings)
+search_old_fund = _offload(db.search_old_fund)
+search_new_fund = _offload(db.search_new_fund)
+search_land     = _offload(db.search_land)
+search_commerce = _offload(db.search_commerce)
+find_object     = _offload(db.find_object)
+
+exists_active_object_code     = _offload(db.exists_active_object_code)
+list_active_by_realtor        = _offload(db.list_active_by_realtor)
+list_active_objects_for_repost = _offload(db.list_active_objects_for_repost)
+renew_repost_claims           = _offload(db.renew_repost_claims)
+release_repost_claims         = _offload(db.release_repost_claims)
+start_repost_sweep            = _offload(db.start_repost_sweep)
+checkpoint_repost_sweep       = _offload(db.checkpoint_repost_sweep)
+finish_repost_sweep           = _offload(db.finish_repost_sweep)
+list_active_without_media     = _offload(db.list_active_without_media)
+client_secondary_exists       = _offload(db.client_secondary_exists)
+
+upsert_channel_posts = _offload(db.upsert_channel_posts)
+get_channel_post     = _offload(db.get_channel_post)
+
+enqueue_publish       = _offload(db.enqueue_publish)
+claim_publish_jobs    = _offload(db.claim_publish_jobs)
+renew_publish_job     = _offload(db.renew_publish_job)
+complete_publish_jobs = _offload(db.complete_publish_jobs)
+fail_publish_job      = _offload(db.fail_publish_job)
+
+list_stale_media  = _offload(db.list_stale_media)
+save_media_checks = _offload(db.save_media_checks)
+
+insert_client_secondary   = _offload(db.insert_client_secondary)
+get_last_client_secondary = _offload(db.get_last_client_secondary)
+get_client_base           = _offload(db.get_client_base)
+upsert_client_base        = _offload(db.upsert_client_base)
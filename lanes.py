@@ -0,0 +1,99 @@
+# lanes.py
+# Параллельная обработка апдейтов с сохранением порядка внутри одного чата.
+#
+# ConversationHandler рассчитан на последовательную обработку, поэтому
+# апдейты одного пользователя (или чата, если пользователя нет — посты канала)
+# идут строго по очереди в своей «полосе», а разные полосы обрабатываются
+# параллельно, не больше max_workers одновременно. Пока полоса занята,
+# ожидающие апдейты не занимают воркер.
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class _Lane:
+    __slots__ = ("lock", "size")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()      # FIFO: порядок апдейтов сохраняется
+        self.size = 0                   # ждут + обрабатывается
+
+
+class ChatLaneProcessor(BaseUpdateProcessor):
+    """
+    max_workers — сколько апдейтов обрабатывается одновременно;
+    max_pending — сколько апдейтов может ждать своей очереди (ограничение
+    BaseUpdateProcessor: сверх него Application не берёт новые из очереди).
+    """
+
+    def __init__(self, max_workers: int = 8, max_pending: int = 256):
+        super().__init__(max_pending)
+        self.max_workers = max_workers
+        self._workers = asyncio.Semaphore(max_workers)
+        self._lanes: Dict[Hashable, _Lane] = {}
+        self._busy = 0
+        self._processed = 0
+        self._max_lane_seen = 0
+
+    @staticmethod
+    def lane_key(update: object) -> Optional[Hashable]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return ("user", update.effective_user.id)
+        if update.effective_chat:
+            return ("chat", update.effective_chat.id)
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self.lane_key(update)
+        if key is None:
+            async with self._workers:
+                await self._run(coroutine)
+            return
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane()
+        lane.size += 1
+        self._max_lane_seen = max(self._max_lane_seen, lane.size)
+        try:
+            async with lane.lock:
+                async with self._workers:
+                    await self._run(coroutine)
+        finally:
+            lane.size -= 1
+            if lane.size == 0:
+                del self._lanes[key]
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        self._busy += 1
+        try:
+            await coroutine
+        finally:
+            self._busy -= 1
+            self._processed += 1
+
+    def stats(self) -> Dict[str, int]:
+        sizes = [lane.size for lane in self._lanes.values()]
+        return {
+            "busy": self._busy,
+            "lanes": len(sizes),
+            "queued": sum(sizes) - sum(1 for lane in self._lanes.values() if lane.lock.locked()),
+            "longest_lane": max(sizes, default=0),
+            "longest_lane_seen": self._max_lane_seen,
+            "processed": self._processed,
+        }
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._lanes:
+            logger.info("lanes: shutting down with %s", self.stats())
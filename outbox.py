@@ -0,0 +1,133 @@
+# outbox.py
+# Фоновая публикация объявлений в канал из очереди publish_outbox.
+#
+# Кнопка «Опубликовать» только записывает объявление и задание (одна
+# транзакция, db.enqueue_publish) и сразу отвечает риелтору. Воркер
+# забирает созревшие задания пачками, отправляет альбомы, одной транзакцией
+# записывает message_ids и уведомляет риелтора. Неудачи повторяются
+# с растущей паузой; доставка «не менее одного раза» — если процесс упал
+# между отправкой альбома и записью в БД, альбом уйдёт повторно.
+#
+# Пачка стоит в очереди отправки долго (лимит канала ~20 сообщений в
+# минуту), поэтому аренда пачки задаётся под пропускную способность канала,
+# а непосредственно перед отправкой альбома publish продлевает аренду
+# (renew_claim). Задание, аренду которого перехватил другой воркер, не
+# отправляется и не завершается этим воркером.
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from db_async import claim_publish_jobs, renew_publish_job, complete_publish_jobs, fail_publish_job
+
+logger = logging.getLogger(__name__)
+
+BATCH        = 10           # заданий за один claim
+MAX_ATTEMPTS = 5
+RETRY_BASE   = 30           # сек; дальше ×2 за попытку
+RETRY_MAX    = 30 * 60
+LEASE        = 450          # сек: BATCH альбомов по 10 при ~20 сообщениях в минуту ×1.5 (lease_for)
+
+# publish(job) → message_ids альбома в канале
+PublishFn = Callable[[Dict[str, Any]], Awaitable[List[int]]]
+# on_done(job, message_ids) / on_failed(job, error) — уведомления, ошибки не критичны
+DoneFn = Callable[[Dict[str, Any], List[int]], Awaitable[Any]]
+FailedFn = Callable[[Dict[str, Any], str], Awaitable[Any]]
+
+
+class ClaimLost(Exception):
+    """Аренда задания истекла и перешла к другому воркеру — публиковать нельзя."""
+
+
+def lease_for(batch_size: int, chat_rate: float, items_per_album: int = 10) -> int:
+    """
+    Аренда пачки: время, за которое канал с лимитом chat_rate (сообщений
+    в секунду) примет batch_size полных альбомов, с запасом в полтора раза.
+    """
+    return int(batch_size * items_per_album / chat_rate * 1.5)
+
+
+async def renew_claim(job: Dict[str, Any], lease_seconds: int = LEASE) -> None:
+    """Вызывать перед самой отправкой альбома; ClaimLost — отправлять нельзя."""
+    if not await renew_publish_job(job["id"], job["claim_token"], lease_seconds):
+        raise ClaimLost(f"job {job['id']} claimed by another worker")
+
+
+def retry_delay(attempts: int) -> float:
+    return min(RETRY_MAX, RETRY_BASE * 2 ** max(0, attempts - 1))
+
+
+async def _notify(fn: Optional[Callable[..., Awaitable[Any]]], *args) -> None:
+    if fn is None:
+        return
+    try:
+        await fn(*args)
+    except Exception as e:
+        logger.warning("outbox: notification failed: %s", e)
+
+
+async def drain_outbox(
+    publish: PublishFn,
+    *,
+    on_done: Optional[DoneFn] = None,
+    on_failed: Optional[FailedFn] = None,
+    batch_size: int = BATCH,
+    max_attempts: int = MAX_ATTEMPTS,
+    lease_seconds: int = LEASE,
+) -> Dict[str, Any]:
+    """
+    Публикует все созревшие задания. Возвращает сводку:
+    published / retried / failed / lost, seconds. lease_seconds должен
+    покрывать отправку всей пачки (см. lease_for).
+    """
+    counts = {"published": 0, "retried": 0, "failed": 0, "lost": 0}
+    started = time.monotonic()
+    token = uuid.uuid4().hex
+
+    async def one(job: Dict[str, Any]):
+        try:
+            return job, await publish(job), None
+        except ClaimLost:
+            return job, None, None
+        except Exception as e:
+            return job, None, str(e) or type(e).__name__
+
+    while True:
+        jobs = await claim_publish_jobs(batch_size, lease_seconds, token)
+        if not jobs:
+            break
+        results = await asyncio.gather(*(one(j) for j in jobs))
+
+        done = [(job["id"], job["object_code"], ids) for job, ids, err in results if ids is not None]
+        completed = set(await complete_publish_jobs(done, token))
+        counts["published"] += len(completed)
+
+        for job, ids, err in results:
+            if ids is not None:
+                if job["id"] in completed:
+                    await _notify(on_done, job, ids)
+                else:
+                    logger.warning("outbox: job %s (%s) sent after its claim was lost",
+                                   job["id"], job["object_code"])
+                continue
+            if err is None:
+                logger.warning("outbox: job %s (%s) claim lost before sending, skipped",
+                               job["id"], job["object_code"])
+                counts["lost"] += 1
+                continue
+            logger.warning("outbox: job %s (%s) attempt %s failed: %s",
+                           job["id"], job["object_code"], job["attempts"], err)
+            if job["attempts"] < max_attempts:
+                await fail_publish_job(job["id"], err, retry_delay(job["attempts"]), token)
+                counts["retried"] += 1
+            else:
+                await fail_publish_job(job["id"], err, None, token)
+                counts["failed"] += 1
+                await _notify(on_failed, job, err)
+
+        if len(jobs) < batch_size:
+            break
+
+    return {**counts, "seconds": round(time.monotonic() - started, 1)}
@@ -0,0 +1,105 @@
+# postindex.py
+# Индекс постов канала: код объекта → (message_ids, обложка, ссылка, posted_at).
+#
+# Записи копятся в памяти и пишутся в channel_posts пачкой (flush из задачи
+# JobQueue). Источники: апдейты channel_post (альбом приходит по одному
+# сообщению, подпись с кодом — только у одного из них) и результаты
+# публикации/репоста самого бота — свои посты бот апдейтами не получает.
+
+import collections
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from telegram import Message
+
+from db_async import upsert_channel_posts, get_channel_post
+
+logger = logging.getLogger(__name__)
+
+CODE_RE = re.compile(r"Код объекта:\s*(\d+)")
+MAX_GROUPS = 500        # сколько последних media_group_id помнить
+
+
+class ChannelPostIndex:
+    def __init__(self, link_for):
+        # link_for(message_id) → публичная ссылка на пост (BotMeta.post_link)
+        self._link_for = link_for
+        self._pending: Dict[str, dict] = {}
+        # media_group_id → [код или None, message_ids]
+        self._groups: "collections.OrderedDict[str, list]" = collections.OrderedDict()
+
+    def add(self, code: str, message_ids: List[int], posted_at: Optional[datetime] = None) -> None:
+        """Публикация/репост альбома: первый id — обложка."""
+        ids = sorted(int(m) for m in message_ids)
+        if not ids:
+            return
+        self._put(code, ids, ids[0], posted_at or datetime.now(timezone.utc))
+
+    def observe(self, msg: Message) -> None:
+        """Сообщение из канала (channel_post)."""
+        m = CODE_RE.search(msg.caption or "")
+        code = m.group(1) if m else None
+        mgid = msg.media_group_id
+        if not mgid:
+            if code:
+                self._put(code, [msg.message_id], msg.message_id, msg.date)
+            return
+
+        group = self._groups.get(mgid)
+        if group is None:
+            group = self._groups[mgid] = [None, []]
+            while len(self._groups) > MAX_GROUPS:
+                self._groups.popitem(last=False)
+        group[1].append(msg.message_id)
+        if code:
+            group[0] = code
+        if group[0]:
+            ids = sorted(group[1])
+            self._put(group[0], ids, ids[0], msg.date)
+
+    def _put(self, code: str, ids: List[int], cover: int, posted_at: datetime) -> None:
+        prev = self._pending.get(code)
+        if prev and prev["cover_id"] == cover:
+            ids = sorted(set(prev["message_ids"]) | set(ids))
+        elif prev and prev["posted_at"] > posted_at:
+            return
+        self._pending[code] = {
+            "message_ids": ids,
+            "cover_id": cover,
+            "link": self._link_for(cover),
+            "posted_at": posted_at,
+        }
+
+    def discard(self, code: str) -> None:
+        """
+        Пост удалён из канала (снятие объекта, удаление перед репостом):
+        незаписанная запись о нём больше не должна отдаваться get().
+        """
+        self._pending.pop(code, None)
+
+    async def get(self, code: str) -> Optional[dict]:
+        """
+        Пост из ещё не записанной пачки или из channel_posts (только активные
+        объекты). Записи снятых объектов из пачки убирает discard().
+        """
+        if code in self._pending:
+            return self._pending[code]
+        return await get_channel_post(code)
+
+    async def flush(self) -> int:
+        """Пишет накопленное одним запросом; при ошибке записи вернёт всё в очередь."""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        try:
+            await upsert_channel_posts([
+                (code, p["message_ids"], p["cover_id"], p["link"], p["posted_at"])
+                for code, p in batch.items()
+            ])
+        except Exception:
+            for code, p in batch.items():
+                self._pending.setdefault(code, p)
+            raise
+        return len(batch)
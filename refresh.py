@@ -1,54 +1,113 @@
 # ─── weekly_refresh.py ─────────────────────────────────────────────
-import asyncio, json, sqlite3, logging
-from datetime import timedelta
+# Проверка file_id медиа активных объявлений через getFile.
+#
+# Для каждого file_id в media_files хранится время последней проверки;
+# за прогон проверяются только «протухшие» (старше STALE_AFTER), параллельно
+# и не быстрее RATE запросов в секунду. Результаты пишутся в БД пачками.
+import asyncio, logging, time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
 from telegram import Bot
 from telegram.ext import ContextTypes
 
-DB_FILE = "realty.db"
-TABLES  = ("old_fund", "new_fund", "land", "commerce")
-CHUNK   = 25        # не более 25 запросов в секунду (лимит Bot API)
-
-async def refresh_file_ids(context: ContextTypes.DEFAULT_TYPE) -> None:
-    bot: Bot = context.bot
-    conn = sqlite3.connect(DB_FILE)
-    cur  = conn.cursor()
-
-    for tbl in TABLES:
-        cur.execute(f"SELECT object_code, photos, videos FROM {tbl} "
-                    "WHERE status='active'")
-        for code, ph_json, vid_json in cur.fetchall():
-            photos = json.loads(ph_json or "[]")
-            videos = json.loads(vid_json or "[]")
-            new_ph, new_vid = [], []
-            updated = False
-
-            # -- фото --
-            for fid in photos:
-                try:
-                    f = await bot.get_file(fid)       # освежаем reference
-                    new_ph.append(f.file_id)
-                    updated |= (f.file_id != fid)
-                except Exception as e:
-                    logging.warning("↯ %s photo %s: %s", code, fid, e)
-
-            # -- видео --
-            for fid in videos:
-                try:
-                    f = await bot.get_file(fid)
-                    new_vid.append(f.file_id)
-                    updated |= (f.file_id != fid)
-                except Exception as e:
-                    logging.warning("↯ %s video %s: %s", code, fid, e)
-
-            # -- обновляем БД, если что-то поменялось --
-            if updated:
-                cur.execute(f"UPDATE {tbl} SET photos=?, videos=? "
-                            "WHERE object_code=?",
-                            (json.dumps(new_ph), json.dumps(new_vid), code))
-        await asyncio.sleep(1 / CHUNK)   # щадим лимиты
-
-    conn.commit()
-    conn.close()
-    logging.info("Weekly refresh done")
+from db_async import list_stale_media, save_media_checks
 
+RATE        = 25        # не более 25 запросов в секунду (лимит Bot API)
+CONCURRENCY = 8
+BATCH       = 200       # file_id на одну запись в БД
+MAX_FILES   = 10_000    # за один прогон
+STALE_AFTER = timedelta(days=7)
 
+
+class _RateLimiter:
+    """Равномерно: не больше rate вызовов wait() в секунду."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def refresh_file_ids(
+    bot: Bot,
+    *,
+    stale_after: timedelta = STALE_AFTER,
+    max_files: int = MAX_FILES,
+    batch_size: int = BATCH,
+    concurrency: int = CONCURRENCY,
+    rate: float = RATE,
+) -> Dict[str, Any]:
+    """
+    Проверяет протухшие file_id и возвращает сводку:
+    checked / replaced / failed / objects_updated, seconds, files_per_sec.
+    """
+    stale_before = (datetime.now(timezone.utc) - stale_after).isoformat()
+    file_ids = await list_stale_media(stale_before, max_files)
+    total = len(file_ids)
+    summary = {"checked": 0, "replaced": 0, "failed": 0, "objects_updated": 0}
+    started = time.monotonic()
+    if not file_ids:
+        logging.info("refresh: nothing stale")
+        return {**summary, "seconds": 0.0, "files_per_sec": 0.0}
+
+    limiter = _RateLimiter(rate)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def check(fid: str):
+        async with sem:
+            await limiter.wait()
+            try:
+                f = await bot.get_file(fid)       # освежаем reference
+                return fid, f.file_id, None
+            except Exception as e:
+                return fid, None, str(e)
+
+    for i in range(0, total, batch_size):
+        verified: List[str] = []
+        replaced: Dict[str, str] = {}
+        failed: Dict[str, str] = {}
+        for fid, new_id, err in await asyncio.gather(*(check(f) for f in file_ids[i:i + batch_size])):
+            if err is not None:
+                logging.warning("↯ file %s: %s", fid, err)
+                failed[fid] = err
+            elif new_id != fid:
+                replaced[fid] = new_id
+            else:
+                verified.append(fid)
+
+        summary["objects_updated"] += await save_media_checks(verified, replaced, failed)
+        summary["checked"] += len(verified) + len(replaced) + len(failed)
+        summary["replaced"] += len(replaced)
+        summary["failed"] += len(failed)
+
+        spent = time.monotonic() - started
+        logging.info(
+            "refresh: %d/%d files (%.1f/s), replaced %d, failed %d",
+            summary["checked"], total, summary["checked"] / spent if spent else 0.0,
+            summary["replaced"], summary["failed"],
+        )
+
+    seconds = time.monotonic() - started
+    return {
+        **summary,
+        "seconds": round(seconds, 1),
+        "files_per_sec": round(summary["checked"] / seconds, 1) if seconds > 0 else 0.0,
+    }
+
+
+async def refresh_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Задача JobQueue: периодический прогон refresh_file_ids."""
+    try:
+        report = await refresh_file_ids(context.bot)
+    except Exception as e:
+        logging.error("refresh_job error: %s", e)
+        return
+    logging.info("Weekly refresh done: %s", report)
@@ -0,0 +1,292 @@
+# sender.py
+# Единая очередь исходящих запросов бота в Telegram (запись в канал).
+#
+# Все send_media_group / delete_message / edit_* в канал идут через
+# SendScheduler: он держит общий и по-чатовый лимиты (token bucket),
+# отдаёт интерактивные публикации раньше фоновых репостов и при 429
+# (RetryAfter) ставит чат на паузу и повторяет запрос сам.
+
+import asyncio
+import collections
+import logging
+import time
+from datetime import timedelta
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional, Set, TypeVar
+
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DELETE_BATCH = 100      # deleteMessages принимает до 100 id за вызов
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0   # /ad, /myads — пользователь ждёт ответа
+    BACKGROUND  = 1   # авторепост и прочие фоновые задачи
+
+
+class _TokenBucket:
+    """rate токенов в секунду, не больше capacity в запасе."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, now: float, cost: float) -> float:
+        """Через сколько секунд можно будет списать cost токенов (0 — уже можно)."""
+        self._refill(now)
+        wait = max(0.0, self.paused_until - now)
+        lack = min(cost, self.capacity) - self.tokens
+        if lack > 0:
+            wait = max(wait, lack / self.rate)
+        return wait
+
+    def take(self, now: float, cost: float) -> None:
+        self._refill(now)
+        self.tokens -= min(cost, self.capacity)
+
+    def pause(self, until: float) -> None:
+        self.paused_until = max(self.paused_until, until)
+
+
+class _Job:
+    __slots__ = ("chat_id", "call", "cost", "priority", "future", "enqueued", "attempts")
+
+    def __init__(self, chat_id, call, cost, priority, future):
+        self.chat_id = chat_id
+        self.call = call
+        self.cost = cost
+        self.priority = priority
+        self.future = future
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+
+def _retry_after_seconds(e: RetryAfter) -> float:
+    ra = e.retry_after
+    return ra.total_seconds() if isinstance(ra, timedelta) else float(ra)
+
+
+class SendScheduler:
+    """
+    Планировщик исходящих запросов.
+
+    • global_rate / global_burst — общий лимит бота (сообщений в секунду);
+    • chat_rate / chat_burst — лимит на один чат (в каналах ~20 сообщений
+      в минуту); альбом стоит столько токенов, сколько в нём элементов;
+    • в один чат одновременно выполняется один запрос; внутри одной очереди
+      приоритета порядок строгий, а фоновый запрос не обгоняет ждущий
+      интерактивный в тот же чат. Интерактивный же может обогнать ранее
+      поставленный фоновый — ради этого приоритеты и нужны (весь канал — один
+      чат). Поэтому шаги одной операции (удалить альбом → отправить заново)
+      вызывающий ставит последовательно, дожидаясь предыдущего;
+    • RetryAfter: чат ставится на паузу, запрос возвращается в начало своей
+      очереди и повторяется, но не больше max_retries раз.
+    """
+
+    def __init__(
+        self,
+        *,
+        global_rate: float = 25.0,
+        global_burst: float = 25.0,
+        chat_rate: float = 20 / 60,
+        chat_burst: float = 10.0,
+        max_retries: int = 3,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = _TokenBucket(global_rate, global_burst)
+        self._chats: Dict[Any, _TokenBucket] = {}
+        self._lanes: Dict[Priority, Deque[_Job]] = {p: collections.deque() for p in Priority}
+        self._in_flight: Set[Any] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._stats: Dict[str, float] = {
+            "sent": 0,
+            "failed": 0,
+            "retry_after": 0,
+            "delete_calls_saved": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+        self._lane_stats = {p: {"queued": 0, "max_depth": 0, "sent": 0} for p in Priority}
+
+    # ── публичное API ──
+    async def call(
+        self,
+        chat_id: Any,
+        fn: Callable[..., Awaitable[T]],
+        *args,
+        priority: Priority = Priority.INTERACTIVE,
+        cost: int = 1,
+        **kwargs,
+    ) -> T:
+        """Ставит fn(*args, **kwargs) в очередь чата chat_id и ждёт результат."""
+        self._ensure_worker()
+        job = _Job(chat_id, lambda: fn(*args, **kwargs), max(1, cost), priority,
+                   asyncio.get_running_loop().create_future())
+        lane = self._lanes[priority]
+        lane.append(job)
+        ls = self._lane_stats[priority]
+        ls["queued"] += 1
+        ls["max_depth"] = max(ls["max_depth"], len(lane))
+        self._wakeup.set()
+        return await job.future
+
+    async def send_media_group(self, bot, chat_id, media, *, priority: Priority = Priority.INTERACTIVE, **kwargs):
+        return await self.call(chat_id, bot.send_media_group, chat_id, media,
+                               priority=priority, cost=len(media), **kwargs)
+
+    async def delete_message(self, bot, chat_id, message_id, *, priority: Priority = Priority.INTERACTIVE):
+        return await self.call(chat_id, bot.delete_message, chat_id, message_id, priority=priority)
+
+    async def delete_messages(
+        self, bot, chat_id, message_ids: Iterable[int], *, priority: Priority = Priority.INTERACTIVE
+    ) -> int:
+        """
+        Удаляет сообщения пачками deleteMessages (до DELETE_BATCH id за вызов);
+        если пачка не прошла — её id удаляются по одному. Возвращает число
+        удалённых (принятая пачка считается удалённой целиком).
+        """
+        ids = [int(m) for m in message_ids]
+        deleted = 0
+        for i in range(0, len(ids), DELETE_BATCH):
+            chunk = ids[i:i + DELETE_BATCH]
+            try:
+                await self.call(chat_id, bot.delete_messages, chat_id, chunk, priority=priority)
+            except Exception as e:
+                logger.warning("sender: deleteMessages failed in chat %s (%s), deleting one by one", chat_id, e)
+            else:
+                deleted += len(chunk)
+                self._stats["delete_calls_saved"] += len(chunk) - 1
+                continue
+            for mid in chunk:
+                try:
+                    await self.delete_message(bot, chat_id, mid, priority=priority)
+                    deleted += 1
+                except Exception as e:
+                    logger.warning("sender: failed to delete %s in chat %s: %s", mid, chat_id, e)
+        return deleted
+
+    async def edit_message_caption(self, bot, chat_id, message_id, *, priority: Priority = Priority.INTERACTIVE, **kwargs):
+        return await self.call(chat_id, bot.edit_message_caption,
+                               chat_id=chat_id, message_id=message_id, priority=priority, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики: отправлено/ошибки/429, ожидание в очереди, глубина очередей."""
+        res: Dict[str, Any] = dict(self._stats)
+        res["in_flight"] = len(self._in_flight)
+        for p in Priority:
+            name = p.name.lower()
+            res[f"{name}_depth"] = len(self._lanes[p])
+            res[f"{name}_max_depth"] = self._lane_stats[p]["max_depth"]
+            res[f"{name}_sent"] = self._lane_stats[p]["sent"]
+        return res
+
+    async def close(self) -> None:
+        """Останавливает диспетчер; ждущие в очереди получают CancelledError."""
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        for lane in self._lanes.values():
+            while lane:
+                job = lane.popleft()
+                if not job.future.done():
+                    job.future.cancel()
+
+    # ── диспетчер ──
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._run(), name="send-scheduler")
+
+    def _bucket(self, chat_id) -> _TokenBucket:
+        b = self._chats.get(chat_id)
+        if b is None:
+            b = self._chats[chat_id] = _TokenBucket(self.chat_rate, self.chat_burst)
+        return b
+
+    def _pick(self, now: float):
+        """Первая готовая задача по приоритету, иначе (None, через сколько проверить)."""
+        soonest = None
+        seen: Set[Any] = set()          # общий для очередей: младшая не обгоняет старшую в том же чате
+        for p in Priority:
+            for job in self._lanes[p]:
+                if job.chat_id in seen or job.chat_id in self._in_flight:
+                    seen.add(job.chat_id)
+                    continue
+                seen.add(job.chat_id)
+                wait = max(self._bucket(job.chat_id).delay(now, job.cost),
+                           self._global.delay(now, job.cost))
+                if wait <= 0:
+                    return job, 0.0
+                soonest = wait if soonest is None else min(soonest, wait)
+        return None, soonest
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            job, wait = self._pick(time.monotonic())
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._lanes[job.priority].remove(job)
+            if job.future.done():          # вызывающий уже отменил ожидание
+                continue
+            now = time.monotonic()
+            self._global.take(now, job.cost)
+            self._bucket(job.chat_id).take(now, job.cost)
+            self._in_flight.add(job.chat_id)
+            if job.attempts == 0:
+                spent = now - job.enqueued
+                self._stats["wait_seconds_total"] += spent
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], spent)
+            asyncio.get_running_loop().create_task(self._execute(job))
+
+    async def _execute(self, job: _Job) -> None:
+        job.attempts += 1
+        try:
+            result = await job.call()
+        except RetryAfter as e:
+            secs = _retry_after_seconds(e)
+            self._stats["retry_after"] += 1
+            self._bucket(job.chat_id).pause(time.monotonic() + secs)
+            if job.attempts <= self.max_retries and not job.future.done():
+                logger.warning("sender: 429 for chat %s, retry in %.0fs", job.chat_id, secs)
+                self._lanes[job.priority].appendleft(job)
+            else:
+                self._stats["failed"] += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+        except Exception as e:
+            self._stats["failed"] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self._stats["sent"] += 1
+            self._lane_stats[job.priority]["sent"] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._in_flight.discard(job.chat_id)
+            if self._wakeup is not None:
+                self._wakeup.set()
@@ -0,0 +1,132 @@
+# test_description_redraw.py
+# Отложенная перерисовка «Описания» (_redraw_description) не затирает
+# под-меню, открытое, пока она ждала DESC_DEBOUNCE.
+#
+#   python -m pytest -q test_description_redraw.py
+
+import asyncio
+import types
+
+import pytest
+
+import channeltest as ct
+
+CHAT = 42
+DEBOUNCE = 0.05
+
+
+class FakeBot:
+    username = "jasur_bot"
+
+    def __init__(self):
+        self.text_edits = []
+
+    async def edit_message_text(self, **kwargs):
+        self.text_edits.append(kwargs)
+
+    async def edit_message_media(self, **kwargs):
+        pass
+
+
+class FakeQuery:
+    def __init__(self):
+        self.data = None
+        self.markups = []
+
+    async def answer(self):
+        pass
+
+    async def edit_message_reply_markup(self, reply_markup=None):
+        self.markups.append(reply_markup)
+
+
+def _anketa():
+    ud = {"ptype": ct.PROPERTY_TYPES[0], "object_code": "10234",
+          "realtor_code": "5551234", "desc_mid": 7}
+    ud["_desc_cap"] = hash(ct._cap(ct.build_caption(ud, FakeBot.username)))
+    ct._remember_keyboard(ud, ct.build_keyboard(ud))
+    return ud
+
+
+@pytest.fixture(autouse=True)
+def short_debounce(monkeypatch):
+    monkeypatch.setattr(ct, "DESC_DEBOUNCE", DEBOUNCE)
+
+
+def _press(update, context, act):
+    update.callback_query.data = act
+    return ct.edit_callback(update, context)
+
+
+async def _drain(ud):
+    task = ud.get("_desc_task")
+    if task:
+        await task
+
+
+def _setup():
+    bot, q = FakeBot(), FakeQuery()
+    update = types.SimpleNamespace(callback_query=q, effective_chat=types.SimpleNamespace(id=CHAT))
+    context = types.SimpleNamespace(user_data=_anketa(), bot=bot)
+    return bot, q, update, context
+
+
+def test_submenu_opened_inside_debounce_survives_redraw():
+    async def scenario():
+        bot, q, update, context = _setup()
+        ud = context.user_data
+        await _press(update, context, "m:tz:0")        # ставит перерисовку
+        await _press(update, context, "menu:district")  # под-меню до её отправки
+        await _drain(ud)
+
+        assert q.markups == [ct.DISTRICT_MENU]
+        assert bot.text_edits, "новый «Тип заявки» должен попасть в текст"
+        assert bot.text_edits[-1]["reply_markup"] is ct.DISTRICT_MENU
+        assert ct.DEAL_TYPES[0] in bot.text_edits[-1]["text"]
+
+        await _press(update, context, "back")
+        await _drain(ud)
+        assert bot.text_edits[-1]["reply_markup"] == ct.build_keyboard(ud)
+        assert "_desc_submenu" not in ud
+
+    asyncio.run(scenario())
+
+
+def test_text_input_keeps_open_submenu():
+    async def scenario():
+        bot, q, update, context = _setup()
+        ud = context.user_data
+        await _press(update, context, "menu:district")
+        ud["Цена"] = "125 000 у.е."
+        await ct.refresh_description(update, context)   # как после ввода текста
+        await _drain(ud)
+
+        assert bot.text_edits[-1]["reply_markup"] is ct.DISTRICT_MENU
+
+    asyncio.run(scenario())
+
+
+def test_keyboard_switch_during_send_is_redone():
+    async def scenario():
+        bot, q, update, context = _setup()
+        ud = context.user_data
+        sent = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_edit(**kwargs):
+            bot.text_edits.append(kwargs)
+            sent.set()
+            await release.wait()
+        bot.edit_message_text = slow_edit
+
+        await _press(update, context, "m:tz:0")
+        await sent.wait()                               # правка с главной клавиатурой в полёте
+        await _press(update, context, "menu:district")
+        release.set()
+        await _drain(ud)
+
+        # Telegram мог применить правки в любом порядке — под-меню отправлено ещё раз
+        assert bot.text_edits[-1]["reply_markup"] is ct.DISTRICT_MENU
+        assert ud["_desc_kb"] == hash(ct.DISTRICT_MENU)
+
+    asyncio.run(scenario())
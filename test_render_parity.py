@@ -0,0 +1,87 @@
+# test_render_parity.py
+# Подписи и клавиатура /ad побайтно совпадают с прежними рендерами.
+#
+# render_parity.json — «замороженные» результаты build_caption() и
+# build_keyboard() до перевода на планы/кеши (вид × тип заявки: полная
+# анкета, минимальная, «горячая» цена, ключи БД, спецсимволы HTML, список
+# «Целевое назначение» и т. п.; клавиатура — строками [текст, callback_data]).
+# Ожидания не пересчитываются из текущего кода: если вывод меняется
+# намеренно — правьте файл руками.
+#
+#   python -m pytest -q test_render_parity.py
+
+import copy
+import json
+import os
+
+import pytest
+
+import channeltest as ct
+
+BOT = "jasur_bot"
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "render_parity.json"),
+          encoding="utf-8") as f:
+    CASES = json.load(f)
+
+_ids = [c["name"] for c in CASES]
+
+
+def _rows(markup):
+    return [[[b.text, b.callback_data] for b in row] for row in markup.inline_keyboard]
+
+
+@pytest.mark.parametrize("case", CASES, ids=_ids)
+def test_caption_parity(case):
+    ct._caption_cache.clear()
+    cold = ct.build_caption(copy.deepcopy(case["record"]), BOT)
+    warm = ct.build_caption(copy.deepcopy(case["record"]), BOT)
+    assert cold == case["caption"]
+    assert warm == case["caption"]
+
+
+@pytest.mark.parametrize("case", CASES, ids=_ids)
+def test_keyboard_parity(case):
+    ct._KB_CACHE.clear()
+    cold = ct.build_keyboard(copy.deepcopy(case["record"]))
+    warm = ct.build_keyboard(copy.deepcopy(case["record"]))
+    assert _rows(cold) == case["keyboard"]
+    assert _rows(warm) == case["keyboard"]
+
+
+def test_caption_cache_keeps_records_apart():
+    # все случаи подряд через один тёплый кеш — ни один не получает чужую подпись
+    ct._caption_cache.clear()
+    for case in CASES + CASES:
+        assert ct.build_caption(copy.deepcopy(case["record"]), BOT) == case["caption"], case["name"]
+
+
+def test_keyboard_cache_keeps_records_apart():
+    ct._KB_CACHE.clear()
+    for case in CASES + CASES:
+        assert _rows(ct.build_keyboard(copy.deepcopy(case["record"]))) == case["keyboard"], case["name"]
+
+
+def _old_menu(options, prefix):
+    # как строил под-меню edit_callback до предвычисленных меню
+    return [[[o, f"{prefix}:{i}"]] for i, o in enumerate(options)] + [[["← Назад", "back"]]]
+
+
+def test_static_menus():
+    assert _rows(ct.DEAL_MENU) == _old_menu(ct.DEAL_TYPES, "m:tz")
+    assert _rows(ct.DISTRICT_MENU) == _old_menu(ct.DISTRICTS, "m:d")
+    for deals in ct.TEMPLATES.values():
+        for tpl in deals.values():
+            for fld, opts in tpl["menu"].items():
+                if fld == "Целевое назначение":
+                    continue
+                expected = _old_menu(opts, f"m:{ct.FIELD_KEYS[fld]}")
+                assert _rows(ct.option_menu(fld, opts)) == expected, fld
+
+
+def test_render_does_not_mutate_record():
+    for case in CASES:
+        rec = copy.deepcopy(case["record"])
+        ct.build_caption(rec, BOT)
+        ct.build_keyboard(rec)
+        assert rec == case["record"], case["name"]
@@ -0,0 +1,166 @@
+# webhook.py
+# Приём апдейтов через webhook вместо long polling.
+#
+# Небольшой HTTP-сервер на asyncio: принимает POST от Telegram, проверяет
+# X-Telegram-Bot-Api-Secret-Token и кладёт Update во внутреннюю очередь
+# приложения (app.update_queue) — обработка идёт отдельно, ответ Telegram
+# уходит сразу. Локально проверяется так:
+#   curl -X POST -H 'X-Telegram-Bot-Api-Secret-Token: <secret>' \
+#        -d @update.json http://127.0.0.1:8080/telegram
+
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from typing import Dict, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY = 1 << 20          # апдейты Telegram заметно меньше мегабайта
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+class WebhookServer:
+    def __init__(self, app: Application, *, listen: str, port: int, url_path: str, secret_token: str):
+        self.app = app
+        self.listen = listen
+        self.port = port
+        self.url_path = "/" + url_path.lstrip("/")
+        self.secret_token = secret_token
+        self._server: Optional[asyncio.base_events.Server] = None
+        self.stats: Dict[str, int] = {"received": 0, "rejected": 0}
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.listen, self.port)
+        logger.info("webhook: listening on %s:%s%s", self.listen, self.port, self.url_path)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, Dict[str, str], bytes, Optional[int]]]:
+        """
+        (method, target, headers, body, error). error — 400/413, если тело
+        не прочитано (Content-Length не число, отрицательный или слишком
+        большой): дальше в соединении мусор, его надо закрыть.
+        """
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            return None
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            return method, target, headers, b"", 400
+        if length < 0:
+            return method, target, headers, b"", 400
+        if length > MAX_BODY:
+            return method, target, headers, b"", 413
+        body = await reader.readexactly(length) if length else b""
+        return method, target, headers, body, None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                req = await self._read_request(reader)
+                if req is None:
+                    break
+                method, target, headers, body, error = req
+                status = error or self._process(method, target, headers, body)
+                keep_alive = error is None and headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Length: 0\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _process(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> int:
+        if target.split("?", 1)[0] != self.url_path:
+            return 404
+        if method != "POST":
+            return 405
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, ""), self.secret_token):
+            self.stats["rejected"] += 1
+            return 403
+        try:
+            update = Update.de_json(json.loads(body), self.app.bot)
+        except Exception as e:
+            logger.warning("webhook: bad update: %s", e)
+            return 400
+        # только постановка в очередь — обработку ведёт Application
+        self.app.update_queue.put_nowait(update)
+        self.stats["received"] += 1
+        return 200
+
+
+async def run_webhook(
+    app: Application,
+    *,
+    listen: str,
+    port: int,
+    url_path: str,
+    secret_token: str,
+    webhook_url: Optional[str] = None,
+) -> None:
+    """
+    Аналог app.run_polling() для webhook: тот же порядок post_init /
+    post_stop / post_shutdown. webhook_url — публичный адрес; если не задан,
+    setWebhook не вызывается (локальная отладка).
+    """
+    server = WebhookServer(app, listen=listen, port=port, url_path=url_path, secret_token=secret_token)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:      # Windows
+            pass
+
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    try:
+        await server.start()
+        await app.start()
+        if webhook_url:
+            await app.bot.set_webhook(
+                webhook_url, secret_token=secret_token, allowed_updates=Update.ALL_TYPES
+            )
+        await stop.wait()
+    finally:
+        await server.close()
+        logger.info("webhook stats: %s", server.stats)
+        if app.running:
+            await app.stop()
+            if app.post_stop:
+                await app.post_stop(app)
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)